@@ -10,9 +10,7 @@ or as an environment variable `GEMINI_API_KEY`.
 """
 
 import os
-import requests # For making HTTP requests to the Gemini API
 from typing import Optional # For type hinting
-import numpy as np
 
 from config_utils import load_app_config, CONFIG_KEY_GEMINI_API_KEY
 
@@ -75,6 +73,7 @@ class AIMarkdownAssistant:
         Returns:
             str: The AI's text response, or an error message prefixed with "[AI Error: ...]".
         """
+        import requests # Deferred until the first request; keeps app startup light
         headers = {"Content-Type": "application/json"}
         params = {"key": self.api_key}
         # Request payload for the Gemini API
@@ -467,6 +466,7 @@ Your task:
         Get an embedding vector for the given text using Gemini API.
         Returns a list of floats (the embedding) or raises Exception on failure.
         """
+        import requests
         # Gemini embedding endpoint (speculative, adjust as needed)
         GEMINI_EMBED_URL = "https://generativelanguage.googleapis.com/v1beta/models/embedding-001:embedContent"
         headers = {"Content-Type": "application/json"}
@@ -485,6 +485,7 @@ Your task:
         """
         Compute cosine similarity between two vectors.
         """
+        import numpy as np # Only semantic search needs numpy
         a = np.array(v1)
         b = np.array(v2)
         return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
@@ -1,5 +1,8 @@
+import copy
+import functools
 import json
 import logging
+import os
 from pathlib import Path
 from PyQt6.QtWidgets import QMessageBox # Required for save_app_config
 
@@ -27,6 +30,11 @@ DEFAULT_CONFIG = {
     CONFIG_KEY_AUTOSAVE_INTERVAL: 60
 }
 
+# In-memory copy of the last loaded/saved config, keyed by the file's mtime.
+# 'dirty' is set while the copy holds changes that update_app_config() has not written yet.
+_CONFIG_CACHE = {'mtime': -1, 'data': None, 'dirty': False}
+
+@functools.lru_cache(maxsize=None)
 def _get_config_path() -> Path:
     """Returns the absolute path to the configuration file.
     Assumes config.json is in the same directory as this utils file,
@@ -68,14 +76,28 @@ def load_app_config() -> dict:
     Returns:
         dict: The configuration dictionary, merged with defaults.
     """
+    if _CONFIG_CACHE['dirty']:
+        # Unwritten changes are newer than whatever is on disk
+        return copy.copy(_CONFIG_CACHE['data'])
+
     config = DEFAULT_CONFIG.copy() # Start with defaults
     config_path = _get_config_path()
 
-    if config_path.exists():
+    try:
+        mtime = os.stat(config_path).st_mtime_ns
+    except OSError:
+        mtime = None
+
+    if mtime is not None:
+        if mtime == _CONFIG_CACHE['mtime']:
+            # File unchanged since the last read/write; shallow copy so callers can mutate freely
+            return copy.copy(_CONFIG_CACHE['data'])
         try:
             with open(config_path, 'r', encoding='utf-8') as f:
                 user_config = json.load(f)
                 config.update(user_config) # Override defaults with user settings
+            _CONFIG_CACHE['mtime'] = mtime
+            _CONFIG_CACHE['data'] = copy.copy(config)
         except json.JSONDecodeError as e:
             logging.warning(f"Could not parse {CONFIG_FILE_NAME} at {config_path}: {e}. Using default config.")
             # QMessageBox.warning(None, "Config Warning", f"Could not parse {CONFIG_FILE_NAME}. Using default settings.") # Optional: UI feedback
@@ -91,6 +113,9 @@ def load_app_config() -> dict:
 def save_app_config(config_data: dict) -> bool:
     """Saves the application configuration to config.json.
 
+    The file is written to a temporary sibling and swapped in with os.replace,
+    so a crash mid-write never leaves a truncated config behind.
+
     Args:
         config_data (dict): The configuration dictionary to save.
 
@@ -98,10 +123,20 @@ def save_app_config(config_data: dict) -> bool:
         bool: True if saving was successful, False otherwise.
     """
     config_path = _get_config_path()
+    tmp_path = config_path.with_name(config_path.name + ".tmp")
     try:
         config_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(config_path, 'w', encoding='utf-8') as f:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
             json.dump(config_data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, config_path)
+        # Keep the cache in step with what was just written so the next load skips the parse
+        cached = DEFAULT_CONFIG.copy()
+        cached.update(config_data)
+        _CONFIG_CACHE['data'] = cached
+        _CONFIG_CACHE['mtime'] = os.stat(config_path).st_mtime_ns
+        _CONFIG_CACHE['dirty'] = False
         return True
     except IOError as e:
         QMessageBox.warning(None, "Config Error", f"Could not write to {CONFIG_FILE_NAME} at {config_path}:\n{e}")
@@ -109,3 +144,28 @@ def save_app_config(config_data: dict) -> bool:
     except TypeError as e:
         QMessageBox.warning(None, "Config Error", f"Invalid data type provided for saving to {CONFIG_FILE_NAME}:\n{e}")
         return False
+
+def update_app_config(config_data: dict) -> None:
+    """Records configuration changes in memory without writing config.json.
+
+    Later load_app_config() calls see the changes immediately; they reach disk
+    on the next flush_app_config() or save_app_config(). Use this for frequent,
+    non-critical settings so bursts of changes cost a single write.
+
+    Args:
+        config_data (dict): The full configuration dictionary, as from load_app_config().
+    """
+    cached = DEFAULT_CONFIG.copy()
+    cached.update(config_data)
+    _CONFIG_CACHE['data'] = cached
+    _CONFIG_CACHE['dirty'] = True
+
+def flush_app_config() -> bool:
+    """Writes changes recorded by update_app_config() to config.json, if there are any.
+
+    Returns:
+        bool: True if nothing was pending or saving was successful, False otherwise.
+    """
+    if not _CONFIG_CACHE['dirty']:
+        return True
+    return save_app_config(_CONFIG_CACHE['data'])
@@ -6,21 +6,33 @@ with AI-assisted features. It includes the primary UI components, event handling
 file operations, and integration with AI and configuration utilities.
 """
 import json
+from collections import OrderedDict
+import operator
 import os
 from pathlib import Path
 import re
 import sys
-import textwrap
 import shutil
+import stat
 import tempfile
 import logging
+import mmap
+import functools
+from typing import TYPE_CHECKING
 import hashlib
 import secrets
+import string
+import subprocess
 import datetime
+import time
 import difflib
+try:
+    import orjson # Optional: faster JSON for the recent-files list
+except ImportError:
+    orjson = None
 
 from config_utils import (
-    load_app_config, save_app_config,
+    load_app_config, save_app_config, update_app_config, flush_app_config,
     CONFIG_KEY_DEFAULT_NOTES_FOLDER, CONFIG_KEY_LAST_NOTE,
     CONFIG_FILE_NAME, CONFIG_KEY_GEMINI_API_KEY, CONFIG_KEY_EDITOR_FONT_FAMILY, CONFIG_KEY_EDITOR_FONT_SIZE,
     CONFIG_KEY_PREVIEW_PANE_VISIBLE, CONFIG_KEY_SIDEBAR_VISIBLE
@@ -28,32 +40,510 @@ from config_utils import (
 
 import PyQt6.QtCore # For version diagnostics
 import PyQt6.QtWebEngineCore # For version diagnostics
-from PyQt6.QtCore import Qt, QTimer, QEventLoop, QEvent, QPoint, QByteArray, QMimeData, QUrl, pyqtSignal, pyqtSlot, QObject # Added QByteArray, QMimeData, QUrl, pyqtSignal, pyqtSlot, QObject
-from PyQt6.QtGui import QAction, QKeySequence, QFont, QColor, QTextCharFormat, QTextCursor, QDesktopServices, QIcon, QPalette, QKeyEvent
+from PyQt6.QtCore import Qt, QTimer, QEventLoop, QEvent, QPoint, QByteArray, QMimeData, QUrl, pyqtSignal, pyqtSlot, QObject, QFileSystemWatcher, QRunnable, QThreadPool # Added QByteArray, QMimeData, QUrl, pyqtSignal, pyqtSlot, QObject
+from PyQt6.QtGui import QAction, QKeySequence, QFont, QColor, QTextCharFormat, QTextCursor, QDesktopServices, QIcon, QKeyEvent
 from PyQt6.QtWidgets import (
     QApplication, QFileDialog, QHBoxLayout, QVBoxLayout, QInputDialog, QLineEdit,
     QMainWindow, QMenu, QMessageBox, QPushButton, QStackedWidget, QTextEdit,
-    QToolBar, QTreeWidget, QTreeWidgetItem, QWidget, QDialog, QLabel, QDialogButtonBox, QListWidget, QComboBox, QTextBrowser, QCheckBox, QGridLayout
+    QToolBar, QTreeWidget, QTreeWidgetItem, QWidget, QDialog, QLabel, QDialogButtonBox, QListWidget, QComboBox, QTextBrowser, QCheckBox, QGridLayout,
+    QStyle, QFormLayout, QSpinBox
 )
 from PyQt6.Qsci import QsciLexerMarkdown, QsciScintilla
 from PyQt6.QtWebEngineWidgets import QWebEngineView # QWebEngineView already imported
 from PyQt6.QtWebEngineCore import QWebEngineSettings, QWebEnginePage # Added for PDF preview settings
 from PyQt6.QtWebChannel import QWebChannel
-from PIL import Image
-from langdetect import detect, LangDetectException
+from PyQt6.QtNetwork import QNetworkAccessManager, QNetworkReply, QNetworkRequest
 
-from ai import AIMarkdownAssistant
 from settings_dialog import SettingsDialog
 import markdown
 from markdown.extensions.toc import TocExtension
 from toc_utils import generate_anchor
-import requests
 from toc_utils import extract_headings, format_toc
 from ai_prompt_dialog import AdvancedSummarizationDialog
 
+if TYPE_CHECKING:
+    from ai import AIMarkdownAssistant # Imported on first AI use (it pulls in requests and numpy)
+
+logger = logging.getLogger(__name__)
+
 DEFAULT_VIEW_MODE_KEY = "default_view_mode"
 REMEMBER_LAST_MODE_KEY = "remember_last_view_mode"
 LAST_VIEW_MODE_KEY = "last_view_mode"
+FAILED_IMAGE_DOWNLOADS_KEY = "failed_image_downloads"
+MAX_FAILED_IMAGE_DOWNLOADS = 1000 # Oldest failures are forgotten beyond this
+FAILED_IMAGE_DOWNLOAD_TTL = 24 * 60 * 60 # Seconds before a failed URL is tried again
+
+# Fallback notes folder, resolved once at import
+_DEFAULT_PATH_STR = os.path.abspath(os.path.expanduser('~/Documents/Marknote'))
+
+# OS-generated files that do not count as folder content
+_IGNORED_DIR_NAMES = frozenset({'.DS_Store', 'Thumbs.db', '.gitkeep', 'desktop.ini'})
+
+# Stylesheet embedded in "Export As... > HTML" pages
+_EXPORT_CSS = """
+        body { font-family: sans-serif; margin: 20px; line-height: 1.6; 
+                background-color: #fdfdfd; color: #333; }
+        code { background-color: #f0f0f0; padding: 2px 4px; border-radius: 3px; 
+                font-family: monospace; }
+        pre { background-color: #f0f0f0; padding: 10px; border-radius: 3px; 
+               overflow-x: auto; white-space: pre-wrap; }
+        /* Add other styles as needed, e.g., for blockquotes, tables */
+"""
+
+# Markdown converter and page wrapper for "Export As... > HTML", built once and reused.
+# The CSS is spliced in here rather than passed through the template on each export.
+_EXPORT_MD = markdown.Markdown(extensions=['fenced_code'])
+_EXPORT_HTML_TEMPLATE = string.Template("""<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <title>Exported: $title</title>
+    <style>""" + _EXPORT_CSS.replace('$', '$$') + """    </style>
+</head>
+<body>
+$body
+</body>
+</html>""")
+
+# Template inserted by Insert > Link; the placeholder is selected so typing replaces it
+_LINK_TEXT_PLACEHOLDER = "Link Text"
+_LINK_TEMPLATE_BYTES = f"[{_LINK_TEXT_PLACEHOLDER}](https://example.com)".encode('utf-8')
+
+# Rich-text body of Help > Markdown & Mermaid Syntax
+_SYNTAX_HELP_HTML = (
+    "<b>Markdown Syntax:</b><br>"
+    "<ul>"
+    "<li><b>Bold:</b> <code>**bold text**</code> or <code>__bold text__</code></li>"
+    "<li><b>Italic:</b> <code>*italic text*</code> or <code>_italic text_</code></li>"
+    "<li><b>Heading:</b> <code># H1</code>, <code>## H2</code>, <code>### H3</code></li>"
+    "<li><b>Unordered List:</b> <code>- Item 1</code><br><code>  - Subitem</code></li>"
+    "<li><b>Ordered List:</b> <code>1. Item 1</code><br><code>   1. Subitem</code></li>"
+    "<li><b>Link:</b> <code>[Link Text](https://example.com)</code></li>"
+    "<li><b>Image:</b> <code>![Alt Text](image_url_or_path.png)</code></li>"
+    "<li><b>Inline Code:</b> <code>`code here`</code></li>"
+    "<li><b>Code Block:</b><br><pre>```python\nprint('Hello')\n```</pre></li>"
+    "<li><b>Blockquote:</b> <code>> Quoted text</code></li>"
+    "<li><b>Horizontal Rule:</b> <code>---</code> or <code>***</code></li>"
+    "</ul>"
+    "<b>Mermaid Diagram Syntax:</b><br>"
+    "Enclose Mermaid syntax in a code block marked with `mermaid`:"
+    "<pre>```mermaid\ngraph TD\n  A[Start] --> B{Decision}\n  B -- Yes --> C[End]\n  B -- No --> D[Alternative]\n```</pre>"
+    "For more details, see the <a href='https://mermaid.js.org/intro/'>official Mermaid documentation</a>."
+)
+
+_HTTP_TIMEOUT = (3.05, 10) # (connect, read) seconds
+
+# requests (and PIL, in _ImageImportTask) are imported on first use rather than at startup
+
+@functools.lru_cache(maxsize=None)
+def _http_session():
+    """
+    Returns the shared HTTP session for image downloads, creating it on first use.
+
+    It keeps connections (and TLS sessions) alive across downloads and retries
+    connection errors and transient 5xx responses with backoff.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504])
+    session = requests.Session()
+    session.mount('https://', HTTPAdapter(pool_connections=8, pool_maxsize=16, max_retries=retry))
+    session.mount('http://', HTTPAdapter(pool_connections=8, pool_maxsize=16, max_retries=retry))
+    return session
+
+_DOWNLOAD_CHUNK_SIZE = 1 << 20 # 1 MiB reads from the HTTP stream
+# Flags for claiming a new file: fails with FileExistsError instead of clobbering
+_EXCL_CREATE_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0)
+
+# Last path segment of a URL, split into stem and extension (query/fragment excluded)
+_URL_FILENAME_RE = re.compile(r'/([^/?#]*?)(?:\.([A-Za-z0-9]{2,5}))?(?:[?#]|$)')
+# Image file extensions accepted from pastes, downloads and the Insert Image dialog
+_IMAGE_EXTS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.svg', '.webp')
+_IMAGE_EXT_SET = frozenset(_IMAGE_EXTS)
+# Folders the library tree never walks (hidden ones are skipped as well)
+_IGNORED_LIBRARY_DIRS = frozenset(('node_modules', '__pycache__', 'venv'))
+# A pasted http(s) URL with nothing else around it
+_URL_RE = re.compile(r'^https?://\S+$')
+# Preview rewrites applied before Markdown conversion
+_MERMAID_RE = re.compile(r'```mermaid\s*([\s\S]*?)```', re.MULTILINE)
+_WIKI_RE = re.compile(r'\[\[([^\]]+)\]\]')
+
+_MMAP_READ_THRESHOLD = 1 << 20 # Notes at least this big (1 MiB) are decoded straight from an mmap
+
+# Themed icons, looked up once per name (the theme engine is not consulted again)
+_ICON_CACHE: dict[str, QIcon] = {}
+
+def _icon(name: str) -> QIcon:
+    """Returns the cached QIcon.fromTheme(name); needs a QApplication on first use."""
+    icon = _ICON_CACHE.get(name)
+    if icon is None:
+        icon = _ICON_CACHE[name] = QIcon.fromTheme(name)
+    return icon
+
+def _asset_rel_path(image_path: str) -> str:
+    """Returns the note-relative, forward-slash link for an image saved in _assets/images."""
+    return f"_assets/images/{os.path.basename(image_path)}"
+
+def _is_blank(text: str) -> bool:
+    """True if text is empty or whitespace only; unlike text.strip(), makes no copy."""
+    return not text or text.isspace()
+
+def _trigrams(text: str) -> set[str]:
+    """Returns the set of 3-character substrings of text (empty if text is shorter)."""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+_SNIFF_SIZE = 512 # Body bytes checked by _is_image_magic; room for an SVG's XML prolog
+
+def _is_image_magic(head: bytes) -> bool:
+    """
+    Checks the first bytes of a download against known image signatures.
+
+    Catches HTML error pages and other non-image bodies served with a 200 status
+    before they are written into the assets folder.
+
+    Args:
+        head (bytes): The first _SNIFF_SIZE (or fewer) bytes of the body.
+
+    Returns:
+        bool: True for PNG, JPEG, GIF, WebP, BMP or SVG content.
+    """
+    if head.startswith((b'\x89PNG', b'\xff\xd8\xff', b'GIF8', b'BM')):
+        return True
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return True
+    text_head = head.lstrip().lower()
+    # Other XML (feeds, S3/CDN error documents, XHTML) is not an image: skip the
+    # prolog (declaration, comments, doctype) and require <svg as the root element
+    while text_head.startswith((b'<?', b'<!')):
+        end = text_head.find(b'>')
+        if end == -1:
+            return False # Prolog runs past the sniffed bytes
+        text_head = text_head[end + 1:].lstrip()
+    return text_head.startswith(b'<svg')
+
+def _write_response_to_file(response, fd: int, prefix: bytes = b'') -> int:
+    """
+    Streams a `requests` response body straight to a file descriptor.
+
+    Reads the raw stream in 1 MiB chunks and writes them with os.write, bypassing
+    the buffered io layer. When the server reports an uncompressed Content-Length,
+    the file is preallocated so it is laid out in one extent.
+
+    Args:
+        response (requests.Response): A response opened with stream=True.
+        fd (int): Open, writable descriptor for the destination file. It is closed on return.
+        prefix (bytes, optional): Body bytes already read from the stream, written first.
+
+    Returns:
+        int: The number of bytes written.
+    """
+    response.raw.decode_content = True # Let urllib3 undo gzip/deflate transfer encoding
+    written = 0
+    chunk = prefix
+    try:
+        try:
+            size_hint = int(response.headers.get('Content-Length', 0))
+        except ValueError:
+            size_hint = 0
+        # Content-Length is the encoded size, so only trust it for identity encoding
+        if size_hint > 0 and not response.headers.get('Content-Encoding') and hasattr(os, 'posix_fallocate'):
+            try:
+                os.posix_fallocate(fd, 0, size_hint)
+            except OSError:
+                pass # Preallocation is only an optimization
+        while True:
+            view = memoryview(chunk)
+            while view:
+                n = os.write(fd, view)
+                view = view[n:]
+            written += len(chunk)
+            chunk = response.raw.read(_DOWNLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+        if written < size_hint:
+            os.ftruncate(fd, written) # Drop any preallocated tail the server did not send
+    finally:
+        os.close(fd)
+    return written
+
+class _ImageTaskSignals(QObject):
+    """Signals emitted by the image QRunnables below; delivered on the GUI thread."""
+    finished = pyqtSignal(str, str) # source url/path, saved file path
+    failed = pyqtSignal(str, str, str) # source url/path, error kind, message
+
+# Optional lossless image optimizers; saved images are left as-is when these are not installed
+_JPEGOPTIM = shutil.which('jpegoptim')
+_OPTIPNG = shutil.which('optipng')
+
+class _ImageOptimizeTask(QRunnable):
+    """Recompresses a saved JPEG/PNG in place with jpegoptim/optipng, without quality loss."""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): The image file to optimize.
+        """
+        super().__init__()
+        self.path = path
+
+    def run(self):
+        ext = os.path.splitext(self.path)[1].lower()
+        if ext in ('.jpg', '.jpeg') and _JPEGOPTIM:
+            cmd = [_JPEGOPTIM, '--strip-all', '--quiet', self.path]
+        elif ext == '.png' and _OPTIPNG:
+            cmd = [_OPTIPNG, '-o2', '-quiet', self.path]
+        else:
+            return
+        try:
+            if os.stat(self.path).st_nlink > 1:
+                return # Hard-linked to the user's original; rewriting would change that file too
+            subprocess.run(cmd, check=False, timeout=60, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.warning("Image optimization skipped for %s: %s", self.path, e)
+
+class _ImageImportTask(QRunnable):
+    """
+    Copies a local image into a note's assets folder off the GUI thread,
+    resizing it first when a width or height was requested.
+    """
+
+    def __init__(self, src_path: str, dest_path: Path, width: int, height: int):
+        """
+        Args:
+            src_path (str): The image file chosen by the user.
+            dest_path (Path): Where to write the copy; normally an empty file already claimed for it.
+            width (int): Target width in px, 0 for original.
+            height (int): Target height in px, 0 for original.
+        """
+        super().__init__()
+        self.src_path = src_path
+        self.dest_path = dest_path
+        self.width = width
+        self.height = height
+        self.signals = _ImageTaskSignals()
+
+    def run(self):
+        try:
+            if self.width > 0 or self.height > 0:
+                from PIL import Image
+                # PIL releases the GIL while resampling, so the GUI keeps painting
+                with Image.open(self.src_path) as img:
+                    orig_w, orig_h = img.size
+                    new_w = self.width if self.width > 0 else orig_w
+                    new_h = self.height if self.height > 0 else orig_h
+                    # For JPEGs, let libjpeg scale by 1/2, 1/4 or 1/8 while decoding (no-op otherwise)
+                    img.draft('RGB', (new_w, new_h))
+                    if img.mode == 'P':
+                        img = img.convert('RGBA') # Resample palette images in full color
+                    # thumbnail() keeps the aspect ratio and never enlarges
+                    img.thumbnail((new_w, new_h), Image.LANCZOS)
+                    img.save(self.dest_path, optimize=True, quality=85)
+            else:
+                try:
+                    # A hard link shares the data blocks instead of copying them. It is made
+                    # under a side name and renamed over the claimed placeholder, so the
+                    # destination name is never free for someone else to take.
+                    link_path = f"{self.dest_path}.link"
+                    os.link(self.src_path, link_path)
+                    os.replace(link_path, self.dest_path)
+                except OSError: # Cross-device, unsupported filesystem, or no permission
+                    Path(link_path).unlink(missing_ok=True)
+                    shutil.copy2(self.src_path, self.dest_path) # Kernel zero-copy where available
+        except Exception as e:
+            logger.exception("Could not import image %s", self.src_path)
+            Path(self.dest_path).unlink(missing_ok=True) # Release the claimed name
+            self.signals.failed.emit(self.src_path, "file", str(e))
+        else:
+            self.signals.finished.emit(self.src_path, str(self.dest_path))
+
+class _ImageDownloadTask(QRunnable):
+    """
+    Downloads an image URL into a note's assets folder off the GUI thread.
+
+    The file extension comes from the response Content-Type, then the URL, and
+    falls back to .png. Transient failures are retried by the session's Retry policy;
+    if the download still fails, it is tried once more with browser-like headers,
+    since some image hosts reject non-browser clients. Results are reported
+    through self.signals.
+    """
+    MAX_ATTEMPTS = 2
+    _BROWSER_HEADERS = {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36",
+        "Accept": "image/avif,image/webp,image/apng,image/*,*/*;q=0.8",
+    }
+    _EXTENSIONS_BY_CONTENT_TYPE = {
+        'image/jpeg': '.jpg', 'image/jpg': '.jpg',
+        'image/png': '.png',
+        'image/gif': '.gif',
+        'image/webp': '.webp',
+        'image/svg+xml': '.svg',
+        'image/bmp': '.bmp'
+    }
+    _IMAGE_EXTENSIONS = _IMAGE_EXT_SET
+
+    def __init__(self, url: str, assets_dir: Path, claim_file):
+        """
+        Args:
+            url (str): The image URL to download.
+            assets_dir (Path): Existing folder to save the image in.
+            claim_file (callable): (directory, ext) -> (fd, Path), atomically creating the target file.
+        """
+        super().__init__()
+        self.url = url
+        self.assets_dir = assets_dir
+        self.claim_file = claim_file
+        self.signals = _ImageTaskSignals()
+        # The URL's own extension, parsed once for the pre-check and every attempt
+        url_match = _URL_FILENAME_RE.search(url)
+        self.url_ext = '.' + url_match.group(2).lower() if url_match and url_match.group(2) else ''
+
+    def _check_content_type(self):
+        """
+        Sends a HEAD request for a URL without an image extension and raises
+        ValueError if the server reports a non-image Content-Type.
+
+        Pages pasted by mistake (.html, extensionless article links) are rejected
+        without fetching the body. Servers that don't answer HEAD, or don't send a
+        Content-Type, fall through to the download and its magic-byte check.
+        """
+        import requests
+        try:
+            with _http_session().head(self.url, timeout=_HTTP_TIMEOUT, allow_redirects=True) as response:
+                if not response.ok:
+                    return
+                content_type = response.headers.get('Content-Type', '').lower()
+        except requests.RequestException:
+            return # Let the GET report the real error
+        if content_type and not content_type.startswith('image/'):
+            raise ValueError(f"The URL points to {content_type.split(';')[0]}, not an image.")
+
+    def _download(self, headers: dict | None) -> Path:
+        """Performs one download attempt and returns the saved file's path."""
+        with _http_session().get(self.url, headers=headers, timeout=_HTTP_TIMEOUT, stream=True) as response:
+            response.raise_for_status()
+
+            # Determine extension from Content-Type or URL
+            content_type = response.headers.get('Content-Type', '').lower().split(';')[0].strip()
+            if content_type in self._EXTENSIONS_BY_CONTENT_TYPE:
+                ext = self._EXTENSIONS_BY_CONTENT_TYPE[content_type]
+            elif self.url_ext in self._IMAGE_EXTENSIONS:
+                ext = self.url_ext
+            else:
+                ext = '.png'  # fallback
+
+            # Sniff the body before creating anything on disk
+            response.raw.decode_content = True
+            head = response.raw.read(_SNIFF_SIZE)
+            if not _is_image_magic(head):
+                raise ValueError("The URL did not return image data.")
+
+            fd, local_filepath = self.claim_file(self.assets_dir, ext)
+            try:
+                _write_response_to_file(response, fd, prefix=head)
+            except Exception:
+                local_filepath.unlink(missing_ok=True) # Don't leave a partial image behind
+                raise
+        return local_filepath
+
+    def run(self):
+        import requests
+        try:
+            if self.url_ext not in self._IMAGE_EXTENSIONS:
+                self._check_content_type()
+            for attempt in range(self.MAX_ATTEMPTS):
+                headers = None if attempt == 0 else {**self._BROWSER_HEADERS, "Referer": self.url}
+                try:
+                    local_filepath = self._download(headers)
+                    break
+                except requests.RequestException:
+                    if attempt == self.MAX_ATTEMPTS - 1:
+                        raise
+        except requests.RequestException as e:
+            self.signals.failed.emit(self.url, "download", str(e))
+        except IOError as e:
+            self.signals.failed.emit(self.url, "file", str(e))
+        except ValueError as e: # Body is not an image; retrying will not help
+            self.signals.failed.emit(self.url, "download", str(e))
+        except Exception as e:
+            logger.exception("Unexpected error downloading image %s", self.url)
+            self.signals.failed.emit(self.url, "unexpected", str(e))
+        else:
+            self.signals.finished.emit(self.url, str(local_filepath))
+
+class _FileTaskSignals(QObject):
+    """Signals emitted by the note file QRunnables below; delivered on the GUI thread."""
+    finished = pyqtSignal(str, str) # file path, content read or written
+    failed = pyqtSignal(str, str) # file path, error message
+
+class _FileReadTask(QRunnable):
+    """Reads a UTF-8 note off the GUI thread."""
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self.signals = _FileTaskSignals()
+
+    def run(self):
+        try:
+            with open(self.path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size >= _MMAP_READ_THRESHOLD:
+                    # Decode from the mapped pages; no intermediate bytes copy of a large note
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        content = str(mm, 'utf-8')
+                else:
+                    content = f.read().decode('utf-8')
+            if '\r' in content: # Same newlines as text mode would give
+                content = content.replace('\r\n', '\n').replace('\r', '\n')
+        except Exception as e: # OSError, UnicodeDecodeError
+            self.signals.failed.emit(self.path, str(e))
+        else:
+            self.signals.finished.emit(self.path, content)
+
+class _FileWriteTask(QRunnable):
+    """Writes a note off the GUI thread."""
+
+    def __init__(self, path: str, text: str):
+        super().__init__()
+        self.path = path
+        self.text = text
+        self.signals = _FileTaskSignals()
+
+    def run(self):
+        try:
+            with open(self.path, 'w', encoding='utf-8') as f:
+                f.write(self.text)
+        except Exception as e:
+            self.signals.failed.emit(self.path, str(e))
+        else:
+            self.signals.finished.emit(self.path, self.text)
+
+class _AITaskSignals(QObject):
+    """Signals emitted by _AITask; delivered on the GUI thread."""
+    finished = pyqtSignal(object) # Whatever the work callable returned
+    failed = pyqtSignal(str) # Error message
+
+class _AITask(QRunnable):
+    """Runs a blocking AI call (a Gemini HTTPS round trip) off the GUI thread."""
+
+    def __init__(self, work):
+        """
+        Args:
+            work (Callable[[], object]): Does the request. It runs on a pool thread,
+                so it must not touch widgets; read what it needs beforehand.
+        """
+        super().__init__()
+        self.work = work
+        self.signals = _AITaskSignals()
+
+    def run(self):
+        try:
+            result = self.work()
+        except Exception as e:
+            logger.exception("AI request failed")
+            self.signals.failed.emit(str(e))
+        else:
+            self.signals.finished.emit(result)
 
 class RecentFilesManager:
     """
@@ -63,20 +553,43 @@ class RecentFilesManager:
     persisting it to a JSON file in the user's home directory.
     """
     MAX_RECENT_FILES = 10
+    MAX_RESOLVED_PATHS = 256 # Entries kept in the resolve() cache before the oldest is dropped
     RECENT_FILES_PATH = Path.home() / '.marknote_recent_files.json'
 
     def __init__(self):
         """Initializes RecentFilesManager, loading recent files from disk."""
-        self.recent_files_list: list[str] = []
+        # Paths as dict keys, oldest first: O(1) lookup, move-to-top and eviction
+        self._recent: dict[str, None] = {}
+        self._resolved_cache: dict[str, str] = {} # Raw path -> resolved path, in insertion (FIFO) order
+        self._last_saved_snapshot: tuple[str, ...] = () # The list as it is on disk
+        # Coalesces bursts of adds into one write; MainWindow.closeEvent flushes what is left
+        self._save_timer = QTimer()
+        self._save_timer.setSingleShot(True)
+        self._save_timer.setInterval(500)
+        self._save_timer.timeout.connect(self.save_recent_files)
         self.load_recent_files()
 
+    @property
+    def recent_files_list(self) -> list[str]:
+        """The recent files, most recent first."""
+        return list(reversed(self._recent))
+
+    @recent_files_list.setter
+    def recent_files_list(self, paths: list[str]):
+        self._recent = dict.fromkeys(reversed(paths))
+
     def load_recent_files(self):
         """Loads the recent files list from a JSON file."""
         if self.RECENT_FILES_PATH.exists():
             try:
-                with open(self.RECENT_FILES_PATH, 'r', encoding='utf-8') as f:
-                    self.recent_files_list = json.load(f)
-            except (IOError, json.JSONDecodeError) as e:
+                if orjson is not None:
+                    with open(self.RECENT_FILES_PATH, 'rb') as f: # orjson parses the raw bytes
+                        self.recent_files_list = orjson.loads(f.read())
+                else:
+                    with open(self.RECENT_FILES_PATH, 'r', encoding='utf-8') as f:
+                        self.recent_files_list = json.load(f)
+                self._last_saved_snapshot = tuple(self.recent_files_list)
+            except (IOError, ValueError) as e: # Both JSONDecodeError and orjson.JSONDecodeError are ValueErrors
                 # Log or handle error, e.g., by informing the user or resetting the list
                 print(f"Error loading recent files: {e}")
                 self.recent_files_list = []
@@ -84,16 +597,33 @@ class RecentFilesManager:
             self.recent_files_list = []
 
     def save_recent_files(self):
-        """Saves the current list of recent files to a JSON file."""
+        """
+        Saves the current list of recent files to a JSON file.
+
+        Does nothing if the list is unchanged since the last load or save. The file
+        is written to a temporary sibling and swapped in with os.replace, so a crash
+        mid-write never leaves a truncated list behind.
+        """
+        self._save_timer.stop() # A pending deferred save is covered by this one
+        snapshot = tuple(self.recent_files_list)
+        if snapshot == self._last_saved_snapshot:
+            return
+        tmp_path = self.RECENT_FILES_PATH.with_suffix(".json.tmp")
         try:
-            with open(self.RECENT_FILES_PATH, 'w', encoding='utf-8') as f:
-                json.dump(self.recent_files_list, f, indent=2)
+            if orjson is not None:
+                with open(tmp_path, 'wb') as f:
+                    f.write(orjson.dumps(self.recent_files_list, option=orjson.OPT_INDENT_2))
+            else:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self.recent_files_list, f, indent=2)
+            os.replace(tmp_path, self.RECENT_FILES_PATH)
+            self._last_saved_snapshot = snapshot
         except IOError as e:
             # Log or display an error message to the user
             print(f"Error saving recent files: {e}")
             # Optionally, inform the user via QMessageBox if critical
 
-    def add_to_recent_files(self, file_path: str):
+    def add_to_recent_files(self, file_path: str) -> bool:
         """
         Adds a file path to the list of recent files.
 
@@ -102,18 +632,32 @@ class RecentFilesManager:
 
         Args:
             file_path (str): The path of the file to add.
+
+        Returns:
+            bool: True if the list changed, False if the path was already at the top.
         """
         if not file_path: # Do not add None or empty paths
-            return
+            return False
         
-        normalized_path = str(Path(file_path).resolve()) # Ensure consistent path format
-
-        if normalized_path in self.recent_files_list:
-            self.recent_files_list.remove(normalized_path)
-        self.recent_files_list.insert(0, normalized_path)
+        # Ensure consistent path format; resolve() stats the filesystem, so remember its result
+        normalized_path = self._resolved_cache.get(file_path)
+        if normalized_path is None:
+            normalized_path = str(Path(file_path).resolve())
+            if len(self._resolved_cache) >= self.MAX_RESOLVED_PATHS:
+                del self._resolved_cache[next(iter(self._resolved_cache))] # Evict the oldest
+            self._resolved_cache[file_path] = normalized_path
+
+        if next(reversed(self._recent), None) == normalized_path:
+            return False # Already the most recent entry, nothing to do
+
+        # Re-inserting moves an existing entry to the end (the top of the list)
+        self._recent.pop(normalized_path, None)
+        self._recent[normalized_path] = None
         # Keep the list at the maximum allowed size
-        self.recent_files_list = self.recent_files_list[:self.MAX_RECENT_FILES]
-        self.save_recent_files()
+        if len(self._recent) > self.MAX_RECENT_FILES:
+            del self._recent[next(iter(self._recent))] # Drop the oldest
+        self._save_timer.start() # Written to disk after 500 ms without further adds
+        return True
 
 class MarkdownEditor(QsciScintilla):
     """
@@ -125,6 +669,23 @@ class MarkdownEditor(QsciScintilla):
     """
     contentChanged = pyqtSignal()  # Add signal at class level
 
+    # Dark theme colors, parsed once for every editor instance
+    _COLOR_DEFAULT = QColor("#d7dae0")
+    _COLOR_PAPER = QColor("#282c34")
+    _COLOR_MARGIN_BG = QColor("#21252b")
+    _COLOR_ACCENT = QColor("#61AFEF") # Line numbers and caret
+    _COLOR_CARET_LINE = QColor("#2c313a")
+    _COLOR_BRACE_MATCH = QColor("#3b4048")
+    _COLOR_BRACE_MISMATCH = QColor("#ff6b6b")
+    _font: QFont | None = None # Built on first use, once a QApplication exists
+
+    @classmethod
+    def _get_font(cls) -> QFont:
+        """Returns the shared editor font, creating it on first call."""
+        if cls._font is None:
+            cls._font = QFont("Fira Mono", 12)
+        return cls._font
+
     def __init__(self, parent=None, main_window=None):
         """
         Initializes the MarkdownEditor.
@@ -136,15 +697,20 @@ class MarkdownEditor(QsciScintilla):
         super().__init__(parent)
         self.main_window = main_window
         self._configure_editor()
+        # contentChanged fires once typing pauses for 150 ms, not on every keystroke
+        self._emit_timer = QTimer(self)
+        self._emit_timer.setSingleShot(True)
+        self._emit_timer.setInterval(150)
+        self._emit_timer.timeout.connect(self.contentChanged.emit)
         self.textChanged.connect(self._on_text_changed)
 
     def _configure_editor(self):
         """Sets up the editor's appearance and behavior."""
         lexer = QsciLexerMarkdown()
-        lexer.setDefaultFont(QFont("Fira Mono", 12)) # Ensure lexer font is set
+        lexer.setDefaultFont(self._get_font()) # Ensure lexer font is set
         # Set colors for dark mode
-        lexer.setColor(QColor("#d7dae0")) # Default text
-        lexer.setPaper(QColor("#282c34")) # Background
+        lexer.setColor(self._COLOR_DEFAULT) # Default text
+        lexer.setPaper(self._COLOR_PAPER) # Background
 
         # Configure specific Markdown elements (examples)
         # lexer.setColor(QColor("#c678dd"), QsciLexerMarkdown.Emphasis) # Italics
@@ -160,16 +726,16 @@ class MarkdownEditor(QsciScintilla):
         self.setUtf8(True)
         
         # Margins and Caret
-        self.setMarginsBackgroundColor(QColor("#21252b"))
-        self.setMarginsForegroundColor(QColor("#61AFEF")) # Line numbers color
-        self.setCaretForegroundColor(QColor("#61AFEF")) # Blinking cursor color
+        self.setMarginsBackgroundColor(self._COLOR_MARGIN_BG)
+        self.setMarginsForegroundColor(self._COLOR_ACCENT) # Line numbers color
+        self.setCaretForegroundColor(self._COLOR_ACCENT) # Blinking cursor color
         self.setCaretLineVisible(True)
-        self.setCaretLineBackgroundColor(QColor("#2c313a")) # Background of the current line
+        self.setCaretLineBackgroundColor(self._COLOR_CARET_LINE) # Background of the current line
 
         # Brace matching
         self.setBraceMatching(QsciScintilla.BraceMatch.SloppyBraceMatch)
-        self.setMatchedBraceBackgroundColor(QColor("#3b4048"))
-        self.setUnmatchedBraceForegroundColor(QColor("#ff6b6b"))
+        self.setMatchedBraceBackgroundColor(self._COLOR_BRACE_MATCH)
+        self.setUnmatchedBraceForegroundColor(self._COLOR_BRACE_MISMATCH)
 
         # Indentation and Tabs
         self.setAutoIndent(True)
@@ -181,13 +747,13 @@ class MarkdownEditor(QsciScintilla):
         self.setFolding(QsciScintilla.FoldStyle.BoxedTreeFoldStyle, margin=2)
         
         # Font for general text not covered by lexer (if any)
-        self.setFont(QFont("Fira Mono", 12)) 
+        self.setFont(self._get_font())
         
         # Ensure base styling for the widget itself
         self.setStyleSheet("background-color: #282c34; color: #d7dae0;")
 
     def _on_text_changed(self):
-        self.contentChanged.emit()
+        self._emit_timer.start() # Restarting an active timer just resets its countdown
 
     def toPlainText(self) -> str:
         """
@@ -208,112 +774,96 @@ class MarkdownEditor(QsciScintilla):
         self.setText(text)
 
     def _process_pasted_data(self, mime_data: QMimeData) -> bool:
-        print("\n*** MARKNOTE PASTE DEBUG: _process_pasted_data CALLED ***")
+        logger.debug("_process_pasted_data called")
         if mime_data.hasText() and self.main_window:
-            print(f"Processing: MimeData has text. Main window reference: {'Valid' if self.main_window else 'INVALID'}")
             text = mime_data.text().strip()
-            print(f"Pasted text (stripped): '{text}'")
-            
-            url_match = re.match(r'^https?://\S+$', text)
-            print(f"URL regex match: {url_match}")
-            
+            logger.debug("Pasted text (stripped): %r", text)
+
+            # Local image files (e.g. drag-and-drop from a file manager) are copied, not downloaded
+            if text.startswith('file://') and QUrl(text).isLocalFile() and \
+                    text.lower().endswith(_IMAGE_EXTS):
+                logger.debug("Pasted text is a local image file URL")
+                self.main_window.handle_pasted_image_url(text)
+                return True # Handled
+
+            url_match = _URL_RE.match(text)
             if url_match:
-                print("Pasted text is a URL.")
                 url = url_match.group(0)
-                print(f"Detected URL: {url}")
                 is_image_url = False
-                image_extensions = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.svg', '.webp')
 
-                # 1. Check by extension (quick check)
-                try:
-                    # Ensure URL has a path component for extension checking
-                    parsed_qurl = QUrl(url)
-                    # path_str will be an empty string if there's no path
-                    path_str = parsed_qurl.path().lower() # Get path as string and lowercase it
-                    if parsed_qurl.isValid() and path_str and path_str != "/": # Check if path exists and is not just "/"
-                        if any(path_str.endswith(ext) for ext in image_extensions):
-                            print(f"URL matched image extension: {path_str}")
-                            is_image_url = True
-                    else:
-                        print(f"URL has no significant path or is invalid for extension check: {url}")
-                except Exception as e:
-                    print(f"Error during URL extension check: {e}")
+                # 1. Check by extension (quick check): the text after the last "." of the
+                # last path segment, with any query or fragment cut off
+                scheme_end = url.find("://") + 3
+                path_end = len(url)
+                for sep in "?#":
+                    sep_index = url.find(sep, scheme_end)
+                    if sep_index != -1 and sep_index < path_end:
+                        path_end = sep_index
+                slash = url.rfind("/", scheme_end, path_end)
+                dot = url.rfind(".", slash, path_end)
+                if slash != -1 and dot > slash: # No slash means no path, so no extension
+                    is_image_url = url[dot:path_end].lower() in _IMAGE_EXT_SET
+
+                # 2. If not identified as image by extension, check Content-Type with an
+                # asynchronous HEAD request; the main window dispatches when it completes
+                if not is_image_url:
+                    logger.debug("URL %s not identified as image by extension, proceeding to HEAD request", url)
+                    self.main_window.probe_pasted_url(url)
+                    return True # Handled (once the reply arrives)
 
+                logger.debug("URL %s matched an image extension", url)
+                self.main_window.handle_pasted_image_url(url)
+                return True # Handled
 
-                # 2. If not identified as image by extension, then check Content-Type via HEAD request
-                if not is_image_url:
-                    print("URL not identified as image by extension, proceeding to HEAD request.")
-                    try:
-                        response = requests.head(url, timeout=3, allow_redirects=True, stream=True)
-                        response.raise_for_status()
-                        content_type = response.headers.get('Content-Type', '').lower()
-                        print(f"HEAD request Content-Type: {content_type}")
-                        if content_type.startswith('image/'):
-                            is_image_url = True
-                            print("Content-Type indicates image.")
-                        else:
-                            print("Content-Type does NOT indicate image.")
-                    except requests.RequestException as e:
-                        print(f"Could not verify URL content type for {url} via HEAD request: {e}")
-                    except Exception as e:
-                        print(f"Unexpected error during HEAD request for {url}: {e}")
-                else:
-                    print("URL already identified as image by extension. Skipping HEAD request.")
-                
-                print(f"FINAL check, is_image_url: {is_image_url}")
-                if is_image_url:
-                    print("Calling handle_pasted_image_url from _process_pasted_data")
-                    self.main_window.handle_pasted_image_url(url)
-                    print("--- End Paste Event (_process_pasted_data handled image) ---")
-                    return True # Handled
-                else:
-                    print("Calling handle_pasted_plain_url from _process_pasted_data")
-                    self.main_window.handle_pasted_plain_url(url)
-                    print("--- End Paste Event (_process_pasted_data handled plain URL) ---")
-                    return True # Handled
-            else: # Not a URL match
-                print("Pasted text is not a URL. Fallback in _process_pasted_data.")
-        else: # No text or no main_window
-            if not mime_data.hasText():
-                print("No text in MimeData. Fallback in _process_pasted_data.")
-            if not self.main_window: # Should not happen if main_window is passed in constructor
-                print("No main_window reference. Fallback in _process_pasted_data.")
-        
-        print("--- End Paste Event (_process_pasted_data did not handle, falling through) ---")
+        logger.debug("_process_pasted_data did not handle the paste, falling through")
         return False # Not handled by this logic
 
     def keyPressEvent(self, event: QKeyEvent):
         if event.matches(QKeySequence.StandardKey.Paste):
-            print("\n*** MARKNOTE PASTE DEBUG: Paste Key Detected in keyPressEvent ***")
             clipboard = QApplication.clipboard()
-            if clipboard:
-                mime_data = clipboard.mimeData()
-                if self._process_pasted_data(mime_data): 
-                    event.accept() # Indicate we've handled the event
-                    print("*** MARKNOTE PASTE DEBUG: Paste event accepted in keyPressEvent. ***")
-                    return # Prevent further processing of this event
-            else:
-                print("*** MARKNOTE PASTE DEBUG: Clipboard not available in keyPressEvent. ***")
-            
-            # If clipboard is None or _process_pasted_data returned False (didn't handle)
-            print("*** MARKNOTE PASTE DEBUG: Paste keyPressEvent falling through to super (clipboard issue or not handled by _process_pasted_data). ***")
-        
+            if clipboard and self._process_pasted_data(clipboard.mimeData()):
+                event.accept() # Indicate we've handled the event
+                return # Prevent further processing of this event
+            # If clipboard is None or _process_pasted_data returned False (didn't handle),
+            # fall through to the default paste
+
         super().keyPressEvent(event) # Call base class implementation for other keys or if paste not handled
 
     def insertFromMimeData(self, source: QMimeData):
         # This method might be called by context menu paste or other non-keyPressEvent actions
-        print("\n*** MARKNOTE PASTE DEBUG: insertFromMimeData CALLED (e.g., by context menu) ***")
         if not self._process_pasted_data(source):
-            print("Fallback to default QScintilla paste from insertFromMimeData (as _process_pasted_data returned False).")
             super().insertFromMimeData(source) # Fallback to default behavior
-        else:
-            print("Paste handled by _process_pasted_data via insertFromMimeData call.")
-        print("--- End Paste Event (from insertFromMimeData method execution path) ---")
 
     def clear(self):
         """Clears all text from the editor."""
         self.setText("")                
 
+class CommandBarTextEdit(QTextEdit):
+    """
+    Multi-line input for AI commands.
+
+    Ctrl+Enter submits the command to the main window; every other key
+    is handled by QTextEdit as usual.
+    """
+    def __init__(self, parent=None, main_window=None):
+        """
+        Initializes the CommandBarTextEdit.
+
+        Args:
+            parent (QWidget, optional): The parent widget. Defaults to None.
+            main_window (MainWindow, optional): Reference to the main window for callbacks.
+        """
+        super().__init__(parent)
+        self.main_window = main_window
+
+    def keyPressEvent(self, event: QKeyEvent):
+        if event.modifiers() == Qt.KeyboardModifier.ControlModifier and \
+           event.key() in (Qt.Key.Key_Return, Qt.Key.Key_Enter) and self.main_window:
+            self.main_window.execute_command()
+            event.accept()
+            return
+        super().keyPressEvent(event)
+
 class WikiLinkPage(QWebEnginePage):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -321,7 +871,8 @@ class WikiLinkPage(QWebEnginePage):
     def acceptNavigationRequest(self, url, nav_type, is_main_frame):
         url_str = url.toString()
         if url_str.startswith('wikilink://'):
-            page = url_str[len('wikilink://'):].replace('%20', ' ')
+            # Decodes every escape (%20, %3A, %2F, ...), not just spaces
+            page = QUrl.fromPercentEncoding(url_str[len('wikilink://'):].encode('utf-8'))
             if self._main_window:
                 self._main_window.handle_wiki_link(page)
             return False
@@ -347,48 +898,8 @@ class MarkdownPreview(QWebEngineView):
     It supports standard Markdown and Mermaid diagrams.
     The preview is themed for dark mode.
     """
-    def __init__(self, parent=None, md_parser=None):
-        """
-        Initializes the MarkdownPreview.
-
-        Args:
-            parent (QWidget, optional): The parent widget. Defaults to None.
-            md_parser (markdown.Markdown, optional): The Markdown parser instance. Defaults to None.
-        """
-        super().__init__(parent)
-        self.setStyleSheet("background-color: #21252b; color: #d7dae0; font-family: sans-serif;")
-        self.current_html: str = ""
-        self.base_url: QUrl = QUrl()
-        self.md_parser = md_parser
-        self.channel = QWebChannel(self.page())
-        # Ensure bridge gets the real MainWindow
-        main_window = parent if parent is not None else QApplication.activeWindow()
-        self.bridge = WikiLinkBridge(main_window)
-        self.channel.registerObject("wikilinkBridge", self.bridge)
-        self.page().setWebChannel(self.channel)
-        # Note: QWebEngineSettings.WebAttribute.PrintSupportEnabled was problematic and removed.
-        # Printing is handled via QPrintDialog and page().print() in MainWindow.
-
-    def set_markdown(self, text: str, base_url: QUrl = None):
-        import re
-        def mermaid_replacer(match: re.Match) -> str:
-            code = match.group(1)
-            return f'<div class="mermaid">{code}</div>'
-        mermaid_pattern = re.compile(r'```mermaid\s*([\s\S]*?)```', re.MULTILINE)
-        text_with_mermaid_divs = mermaid_pattern.sub(mermaid_replacer, text)
-        def wiki_link_replacer(match: re.Match) -> str:
-            page = match.group(1).strip()
-            href = f"wikilink://{page.replace(' ', '%20')}"
-            return f'<a href="{href}" class="wikilink">[[{page}]]</a>'
-        wiki_pattern = re.compile(r'\[\[([^\]]+)\]\]')
-        text_with_wikilinks = wiki_pattern.sub(wiki_link_replacer, text_with_mermaid_divs)
-        if self.md_parser:
-            html_body = self.md_parser.convert(text_with_wikilinks)
-            self.md_parser.reset()
-        else:
-            html_body = markdown.markdown(text_with_wikilinks, extensions=['fenced_code', 'extra', 'md_in_html'])
-        # Inject JS for wiki-link interception
-        injected_js = r'''
+    # Intercepts wiki-link clicks and forwards them to the WikiLinkBridge
+    _INJECTED_JS = r'''
         <script type="text/javascript" src="qrc:///qtwebchannel/qwebchannel.js"></script>
         <script>
         document.addEventListener("DOMContentLoaded", function() {
@@ -407,20 +918,26 @@ class MarkdownPreview(QWebEngineView):
         });
         </script>
         '''
-        if '<div class="mermaid">' in html_body:
-            from pathlib import Path
-            mermaid_path = Path(__file__).parent / "_assets" / "mermaid.min.js"
-            mermaid_url = mermaid_path.resolve().as_uri()
-            full_html = f'''
-            <html>
-            <head>
+    _PAGE_STYLE = '''
                 <style>
-                    body {{ background: #fff; color: #111; font-family: sans-serif; }}
-                    pre {{ background-color: #f0f0f0; padding: 10px; border-radius: 5px; overflow-x: auto; }}
-                    code {{ font-family: "Fira Mono", monospace; }}
-                </style>
-                <script src="{mermaid_url}"></script>
-                {injected_js}
+                    body { background: #fff; color: #111; font-family: sans-serif; }
+                    pre { background-color: #f0f0f0; padding: 10px; border-radius: 5px; overflow-x: auto; }
+                    code { font-family: "Fira Mono", monospace; }
+                </style>'''
+    _MERMAID_URL = (Path(__file__).parent / "_assets" / "mermaid.min.js").resolve().as_uri()
+    # Everything around the rendered body is invariant, so the pages are built once
+    # here and set_markdown only joins them: (start, body, _PAGE_END)
+    _PAGE_START = f'''
+            <html>
+            <head>{_PAGE_STYLE}
+                {_INJECTED_JS}
+            </head>
+            <body>'''
+    _MERMAID_PAGE_START = f'''
+            <html>
+            <head>{_PAGE_STYLE}
+                <script src="{_MERMAID_URL}"></script>
+                {_INJECTED_JS}
                 <script>
                 document.addEventListener("DOMContentLoaded", function() {{
                   if (window.mermaid) {{
@@ -430,26 +947,162 @@ class MarkdownPreview(QWebEngineView):
                 }});
                 </script>
             </head>
-            <body>{html_body}</body>
-            </html>
-            '''
-        else:
-            full_html = f'''
-            <html>
-            <head>
-                <style>
-                    body {{ background: #fff; color: #111; font-family: sans-serif; }}
-                    pre {{ background-color: #f0f0f0; padding: 10px; border-radius: 5px; overflow-x: auto; }}
-                    code {{ font-family: "Fira Mono", monospace; }}
-                </style>
-                {injected_js}
-            </head>
-            <body>{html_body}</body>
+            <body>'''
+    _PAGE_END = '''</body>
             </html>'''
+
+    def __init__(self, md_parser: markdown.Markdown, parent=None):
+        """
+        Initializes the MarkdownPreview.
+
+        Args:
+            md_parser (markdown.Markdown): The shared Markdown parser; it is reset after every conversion.
+            parent (QWidget, optional): The parent widget. Defaults to None.
+        """
+        super().__init__(parent)
+        self.setStyleSheet("background-color: #21252b; color: #d7dae0; font-family: sans-serif;")
+        self.current_html: str = ""
+        self.base_url: QUrl = QUrl()
+        self._last_text_hash: int | None = None # hash() of the text behind current_html
+        # Latest set_markdown arguments received while hidden, rendered when shown
+        self._preview_dirty: bool = False
+        self._pending_text: str = ""
+        self._pending_base_url: QUrl | None = None
+        self.md_parser = md_parser
+        self.channel = QWebChannel(self.page())
+        # Ensure bridge gets the real MainWindow
+        main_window = parent if parent is not None else QApplication.activeWindow()
+        self.bridge = WikiLinkBridge(main_window)
+        self.channel.registerObject("wikilinkBridge", self.bridge)
+        self.page().setWebChannel(self.channel)
+        # Note: QWebEngineSettings.WebAttribute.PrintSupportEnabled was problematic and removed.
+        # Printing is handled via QPrintDialog and page().print() in MainWindow.
+
+    @staticmethod
+    def _mermaid_replacer(match: re.Match) -> str:
+        code = match.group(1)
+        return f'<div class="mermaid">{code}</div>'
+
+    @staticmethod
+    def _wiki_link_replacer(match: re.Match) -> str:
+        page = match.group(1).strip()
+        href = f"wikilink://{page.replace(' ', '%20')}"
+        return f'<a href="{href}" class="wikilink">[[{page}]]</a>'
+
+    def set_markdown(self, text: str, base_url: QUrl = None):
+        if not self.isVisible():
+            # Nobody can see the page: defer the parse and reload until showEvent
+            self._pending_text = text
+            if base_url or not self._preview_dirty:
+                self._pending_base_url = base_url
+            self._preview_dirty = True
+            return
+        self._preview_dirty = False
+        self._render(text, base_url)
+
+    def _render(self, text: str, base_url: QUrl | None):
+        """Converts text to the preview page and loads it, unless it is already showing."""
+        # Skip the parse and the page reload when nothing would change
+        text_hash = hash(text)
+        if text_hash == self._last_text_hash and (not base_url or base_url == self.base_url):
+            return
+        text_with_mermaid_divs = _MERMAID_RE.sub(self._mermaid_replacer, text)
+        text_with_wikilinks = _WIKI_RE.sub(self._wiki_link_replacer, text_with_mermaid_divs)
+        html_body = self.md_parser.convert(text_with_wikilinks)
+        self.md_parser.reset()
+        page_start = self._MERMAID_PAGE_START if '<div class="mermaid">' in html_body else self._PAGE_START
+        full_html = ''.join((page_start, html_body, self._PAGE_END))
         self.current_html = full_html
         if base_url:
             self.base_url = base_url
-        self.setHtml(self.current_html, baseUrl=self.base_url)
+        # Encode once and hand Qt the bytes directly, instead of letting setHtml convert the str
+        self.setContent(QByteArray(full_html.encode('utf-8')), "text/html;charset=UTF-8", self.base_url)
+        self._last_text_hash = text_hash
+
+    def render_pending(self):
+        """Renders Markdown that arrived while the preview was hidden, so current_html is up to date."""
+        if self._preview_dirty:
+            self._preview_dirty = False
+            # Bypass the visibility check; callers need current_html even when hidden
+            text, base_url = self._pending_text, self._pending_base_url
+            self._pending_text, self._pending_base_url = "", None
+            self._render(text, base_url)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.render_pending()
+
+class _InsertImageDialog(QDialog):
+    """
+    Collects everything Insert > Image needs in one dialog: the source
+    (a local file or a URL), the file path or URL, and an optional size.
+    """
+    def __init__(self, parent=None):
+        """
+        Initializes the _InsertImageDialog.
+
+        Args:
+            parent (QWidget, optional): The parent widget. Defaults to None.
+        """
+        super().__init__(parent)
+        self.setWindowTitle("Insert Image")
+        layout = QFormLayout(self)
+
+        self.modeCombo = QComboBox()
+        self.modeCombo.addItems(["File", "URL"])
+        self.modeCombo.currentTextChanged.connect(self._on_mode_changed)
+        layout.addRow("Source:", self.modeCombo)
+
+        path_row = QHBoxLayout()
+        self.pathEdit = QLineEdit()
+        self.pathEdit.textChanged.connect(self._update_ok_button)
+        path_row.addWidget(self.pathEdit)
+        self.browseButton = QPushButton("Browse...")
+        self.browseButton.clicked.connect(self._browse)
+        path_row.addWidget(self.browseButton)
+        layout.addRow("Image:", path_row)
+
+        # 0 means "keep the original size"
+        self.widthSpin = QSpinBox()
+        self.heightSpin = QSpinBox()
+        for spin in (self.widthSpin, self.heightSpin):
+            spin.setRange(0, 10000)
+            spin.setSuffix(" px")
+            spin.setSpecialValueText("Original")
+        layout.addRow("Width:", self.widthSpin)
+        layout.addRow("Height:", self.heightSpin)
+
+        self.buttonBox = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        self.buttonBox.accepted.connect(self.accept)
+        self.buttonBox.rejected.connect(self.reject)
+        layout.addRow(self.buttonBox)
+
+        self._on_mode_changed(self.modeCombo.currentText())
+
+    def _on_mode_changed(self, mode: str):
+        """Switches the path field between file and URL entry."""
+        self.browseButton.setVisible(mode == "File")
+        self.pathEdit.setPlaceholderText("Path to an image file" if mode == "File" else "https://... (separate several URLs with spaces)")
+        self._update_ok_button()
+
+    def _update_ok_button(self):
+        """Only allows OK once an image file or URL has been given."""
+        self.buttonBox.button(QDialogButtonBox.StandardButton.Ok).setEnabled(bool(self.pathEdit.text().strip()))
+
+    def _browse(self):
+        """Picks a local image file into the path field."""
+        file_path, _ = QFileDialog.getOpenFileName(self, "Select Image File", "", "Images (*.png *.jpg *.jpeg *.gif *.bmp *.webp)")
+        if file_path:
+            self.pathEdit.setText(file_path)
+
+    def values(self) -> tuple[str, str, int, int]:
+        """
+        Returns the dialog's inputs.
+
+        Returns:
+            tuple[str, str, int, int]: (mode, file path or URL, width, height); sizes are 0 for original.
+        """
+        return self.modeCombo.currentText(), self.pathEdit.text().strip(), self.widthSpin.value(), self.heightSpin.value()
 
 class PrintPreviewDialog(QDialog):
     """
@@ -519,47 +1172,64 @@ class MainWindow(QMainWindow):
     AI interactions, and overall application state.
     """
     # Stylesheet for the menubar, giving it a dark theme consistent appearance
-    MENUBAR_STYLESHEET = textwrap.dedent("""
-        QMenuBar {
-            background: #23252b;
-            color: #61AFEF;
-            font-size: 14px;
-        }
-        QMenuBar::item {
-            background: transparent;
-            color: #61AFEF;
-            padding: 4px 12px;
-        }
-        QMenuBar::item:selected {
-            background: #2c313a;
-            color: #98c379;
-        }
-        QMenu {
-            background: #23252b;
-            color: #d7dae0;
-            border: 1px solid #282c34;
-        }
-        QMenu::item {
-            background: transparent;
-            color: #d7dae0;
-            padding: 6px 24px 6px 24px;
-        }
-        QMenu::item:selected {
-            background: #2c313a;
-            color: #98c379;
-        }
-        QMenu::separator {
-            height: 1px;
-            background: #282c34;
-            margin: 4px 0px 4px 0px;
-        }
-    """)
+    MENUBAR_STYLESHEET = """
+QMenuBar {
+    background: #23252b;
+    color: #61AFEF;
+    font-size: 14px;
+}
+QMenuBar::item {
+    background: transparent;
+    color: #61AFEF;
+    padding: 4px 12px;
+}
+QMenuBar::item:selected {
+    background: #2c313a;
+    color: #98c379;
+}
+QMenu {
+    background: #23252b;
+    color: #d7dae0;
+    border: 1px solid #282c34;
+}
+QMenu::item {
+    background: transparent;
+    color: #d7dae0;
+    padding: 6px 24px 6px 24px;
+}
+QMenu::item:selected {
+    background: #2c313a;
+    color: #98c379;
+}
+QMenu::separator {
+    height: 1px;
+    background: #282c34;
+    margin: 4px 0px 4px 0px;
+}
+"""
 
-    failed_image_downloads = set()
+    failed_image_downloads: OrderedDict = OrderedDict() # URL -> failure time, oldest first; persisted in config
 
     def __init__(self):
         """Initializes the MainWindow, setting up UI, loading configurations, and recent files."""
         super().__init__()
+
+        # Deferred config writes (see _save_config_later); flushed at the latest on quit
+        self._config_save_timer = QTimer(self)
+        self._config_save_timer.setSingleShot(True)
+        self._config_save_timer.setInterval(1000)
+        self._config_save_timer.timeout.connect(flush_app_config)
+        QApplication.instance().aboutToQuit.connect(flush_app_config)
+
+        # Image URLs that failed to download recently (also in earlier sessions) are not retried
+        stored_failures = load_app_config().get(FAILED_IMAGE_DOWNLOADS_KEY, {})
+        if not isinstance(stored_failures, dict):
+            stored_failures = {} # Older list format had no failure times; retry those URLs
+        cutoff = time.time() - FAILED_IMAGE_DOWNLOAD_TTL
+        MainWindow.failed_image_downloads = OrderedDict(
+            sorted(((url, failed_at) for url, failed_at in stored_failures.items()
+                    if isinstance(failed_at, (int, float)) and failed_at > cutoff), key=operator.itemgetter(1))
+        )
         
         # Determine and set up the default folder for documents
         self.default_folder: str = self.get_or_create_default_folder()
@@ -570,8 +1240,33 @@ class MainWindow(QMainWindow):
         
         # State variables
         self.current_file: str | None = None # Path to the currently open file
-        self.last_saved_text: str = ""      # Content of the editor when last saved
-        self.ai: AIMarkdownAssistant | None = None # AI Assistant instance
+        self.ai: 'AIMarkdownAssistant | None' = None # Created on first AI use, with its imports
+        self._recent_menu_update_pending: bool = False # Set while a menu rebuild is queued
+        self._image_task_signals: set = set() # Signals of image tasks still in flight
+        self._assets_dir: Path | None = None # Images folder of the current note, once created
+        # Separate single-thread pool so image optimization never delays downloads or resizes
+        self._postprocess_pool = QThreadPool(self)
+        self._postprocess_pool.setMaxThreadCount(1)
+        # Note reads and writes run here; one thread keeps saves of a file in order
+        self._file_io_pool = QThreadPool(self)
+        self._file_io_pool.setMaxThreadCount(1)
+        self._file_task_signals: set = set() # Signals of note reads/writes still in flight
+        self._ai_task_signals: set = set() # Signals of AI requests still in flight
+        self._pending_read_path: str | None = None # Note being loaded; older loads are ignored
+        self._read_only_before_load: bool = False # Restored if the load fails
+        # Answers the paste-time HEAD probes without blocking the event loop
+        self._nam = QNetworkAccessManager(self)
+        self._nam.setTransferTimeout(3000)
+
+        # Coalesces bursts of preview refreshes (e.g. several quick pastes) into one render
+        self._preview_timer = QTimer(self)
+        self._preview_timer.setSingleShot(True)
+        self._preview_timer.setInterval(120)
+        self._preview_timer.timeout.connect(self.update_preview)
+
+        # Library tree icons, looked up once and shared by every tree item
+        self._dir_icon: QIcon = self.style().standardIcon(QStyle.StandardPixmap.SP_DirIcon)
+        self._file_icon: QIcon = self.style().standardIcon(QStyle.StandardPixmap.SP_FileIcon)
 
         # Initialize Markdown parser with ToC extension and custom slugify
         self.md_parser = markdown.Markdown(
@@ -651,6 +1346,9 @@ class MainWindow(QMainWindow):
         self._last_autosave_text = ""
         self._setup_autosave_timer()
 
+        # Populate the library on the first event-loop tick so the window paints first
+        QTimer.singleShot(0, self.refresh_library)
+
     def _setup_autosave_timer(self):
         if self._autosave_enabled:
             self._autosave_timer.start(self._autosave_interval * 1000)
@@ -663,8 +1361,7 @@ class MainWindow(QMainWindow):
             return  # Don't autosave new/unsaved files
         current_text = self.editor.toPlainText()
         if current_text != self._last_autosave_text:
-            self.save_file()
-            self._last_autosave_text = current_text
+            self.save_file() # _last_autosave_text is updated once the write lands
             self.statusBar().showMessage(f"Auto-saved at {datetime.datetime.now().strftime('%H:%M:%S')}", 2000)
 
     def set_view_mode(self, mode):
@@ -686,13 +1383,14 @@ class MainWindow(QMainWindow):
         
         config = load_app_config()
         config[CONFIG_KEY_PREVIEW_PANE_VISIBLE] = is_visible
-        save_app_config(config)
+        self._save_config_later(config)
 
     def print_document(self):
         """Show HTML preview dialog and let user print via browser's print dialog."""
         if not self.preview:
             QMessageBox.critical(self, "Error", "Preview pane is not available.")
             return
+        self.preview.render_pending() # current_html lags behind while the preview is hidden
         html_content = self.preview.current_html
         base_url = self.preview.base_url
         if not html_content:
@@ -717,27 +1415,6 @@ class MainWindow(QMainWindow):
             print("Print operation failed.")
             QMessageBox.warning(self, "Print Error", "Could not print the document.")
         
-    def command_bar_key_press_event(self, event: QEvent): # Added type hint for event
-        """
-        Handles key press events for the AI command bar.
-        Specifically, Ctrl+Enter executes the command.
-
-        Args:
-            event (QEvent): The key event.
-        """
-        from PyQt6.QtGui import QKeyEvent # Local import for type checking if needed
-        if isinstance(event, QKeyEvent): # Ensure it's a QKeyEvent
-            if event.modifiers() == Qt.KeyboardModifier.ControlModifier and \
-               event.key() in (Qt.Key.Key_Return, Qt.Key.Key_Enter):
-                self.execute_command()
-            else:
-                # Default handling for other key presses in the QTextEdit
-                QTextEdit.keyPressEvent(self.command_bar, event) 
-        else:
-            # Fallback for other event types, though primarily expecting QKeyEvent
-            QTextEdit.keyPressEvent(self.command_bar, event)
-
-
     def closeEvent(self, event: QEvent): # Added type hint for event
         """
         Handles the window close event.
@@ -756,6 +1433,8 @@ class MainWindow(QMainWindow):
             # Add current file to recent files list (manager handles duplicates)
             if self.current_file: # Ensure current_file is not None
                 self.recent_files_manager.add_to_recent_files(self.current_file)
+            self.recent_files_manager.save_recent_files() # Flush the deferred save
+            self._file_io_pool.waitForDone() # Let background saves finish before exiting
             event.accept() # Proceed with closing
 
     def _init_menubar(self):
@@ -796,7 +1475,7 @@ class MainWindow(QMainWindow):
 
         file_menu.addSeparator()
 
-        self.print_action = QAction(QIcon.fromTheme("document-print"), "&Print...", self)
+        self.print_action = QAction(_icon("document-print"), "&Print...", self)
         self.print_action.setShortcut(QKeySequence.StandardKey.Print)
         self.print_action.triggered.connect(self.print_document)
         file_menu.addAction(self.print_action)
@@ -895,125 +1574,6 @@ class MainWindow(QMainWindow):
         self.adv_summarization_action.triggered.connect(self.show_advanced_summarization_dialog)
         self.tools_menu.addAction(self.adv_summarization_action)
 
-    def init_ui(self):
-        # Set dark palette
-        palette = QPalette()
-        palette.setColor(QPalette.ColorRole.Window, QColor("#282c34"))
-        palette.setColor(QPalette.ColorRole.WindowText, QColor("#d7dae0"))
-        self.setPalette(palette)
-
-        # Menu bar with File and Help
-        menubar = self.menuBar()
-        menubar.setStyleSheet(self.MENUBAR_STYLESHEET)
-
-        # File Menu
-        file_menu = menubar.addMenu("File")
-
-        new_action = QAction("New", self)
-        new_action.triggered.connect(self.new_file)
-        file_menu.addAction(new_action)
-
-        open_file_action = QAction("Open File", self)
-        open_file_action.triggered.connect(self.open_file)
-        file_menu.addAction(open_file_action)
-
-        open_folder_action = QAction("Open Folder", self)
-        open_folder_action.triggered.connect(self.open_folder)
-        file_menu.addAction(open_folder_action)
-
-        # Open Recent submenu (placeholder for now)
-        self.recent_files_menu = QMenu("Open Recent", self)
-        file_menu.addMenu(self.recent_files_menu)
-        self.update_recent_files_menu() # Call to populate it (will be empty initially)
-
-        file_menu.addSeparator()
-
-        save_action = QAction("Save", self)
-        save_action.triggered.connect(self.save_file)
-        save_action.setShortcut(QKeySequence("Ctrl+S"))
-        file_menu.addAction(save_action)
-
-        save_as_action = QAction("Save As", self)
-        save_as_action.triggered.connect(self.save_file_as)
-        save_as_action.setShortcut(QKeySequence("Ctrl+Shift+S"))
-        file_menu.addAction(save_as_action)
-
-        file_menu.addSeparator()
-
-        print_action = QAction("Print", self)
-        print_action.triggered.connect(self.print_document)
-        print_action.setShortcut(QKeySequence("Ctrl+P"))
-        file_menu.addAction(print_action)
-
-        file_menu.addSeparator()
-
-        export_as_action = QAction("Export As...", self)
-        export_as_action.triggered.connect(self.export_file_as)
-        file_menu.addAction(export_as_action)
-
-        insert_image_action = QAction("Insert Image...", self)
-        insert_image_action.triggered.connect(self.insert_image)
-        file_menu.addAction(insert_image_action)
-
-        file_menu.addSeparator() # Added separator for consistency
-
-        exit_action = QAction("Exit", self)
-        exit_action.triggered.connect(self.close_application)
-        file_menu.addAction(exit_action)
-
-        # --- Other Menu ---
-        other_menu = menubar.addMenu("Other")
-
-        link_action = QAction("Insert Link", self) # More descriptive
-        link_action.triggered.connect(self.insert_link)
-        other_menu.addAction(link_action)
-
-        ai_command_action = QAction("AI Command", self) # More descriptive
-        ai_command_action.setShortcut(QKeySequence("Ctrl+Shift+Space"))
-        ai_command_action.triggered.connect(self.show_command_bar)
-        other_menu.addAction(ai_command_action)
-        
-        # --- Help Menu ---
-        help_menu = menubar.addMenu("Help")
-        shortcuts_action = QAction("Keyboard Shortcuts", self)
-        shortcuts_action.triggered.connect(self.show_shortcut_help)
-        help_menu.addAction(shortcuts_action)
-        syntax_action = QAction("Markdown & Mermaid Syntax", self)
-        syntax_action.triggered.connect(self.show_syntax_help)
-        help_menu.addAction(syntax_action)
-
-        # Remove 'Other' menu, only add 'Tools' menu
-        tools_menu = self.menuBar().addMenu("Tools")
-        link_action = QAction("Insert Link", self)
-        link_action.triggered.connect(self.insert_link)
-        tools_menu.addAction(link_action)
-        ai_command_action = QAction("AI Command", self)
-        ai_command_action.setShortcut(QKeySequence("Ctrl+Shift+Space"))
-        ai_command_action.triggered.connect(self.show_command_bar)
-        tools_menu.addAction(ai_command_action)
-        insert_image_action = QAction("Insert Image...", self)
-        insert_image_action.triggered.connect(self.insert_image)
-        tools_menu.addAction(insert_image_action)
-        ai_create_table_action = QAction("AI Create Table...", self)
-        ai_create_table_action.triggered.connect(self.ai_create_table)
-        tools_menu.addAction(ai_create_table_action)
-        ai_create_mermaid_action = QAction("AI Create Mermaid Diagram...", self)
-        ai_create_mermaid_action.triggered.connect(self.ai_create_mermaid_diagram)
-        tools_menu.addAction(ai_create_mermaid_action)
-        toc_action = QAction("Generate Table of Contents", self)
-        toc_action.triggered.connect(self.insert_table_of_contents)
-        tools_menu.addAction(toc_action)
-
-        edit_menu = menubar.addMenu("Edit")
-        find_action = QAction("Find", self)
-        find_action.setShortcut(QKeySequence("Ctrl+F"))
-        find_action.triggered.connect(self.show_find_replace)
-        edit_menu.addAction(find_action)
-        replace_action = QAction("Replace", self)
-        replace_action.setShortcut(QKeySequence("Ctrl+H"))
-        replace_action.triggered.connect(self.show_find_replace)
-        edit_menu.addAction(replace_action)
-
     def _setup_central_widget(self):
         central_widget = QWidget()
         central_layout = QVBoxLayout()
@@ -1071,7 +1631,7 @@ class MainWindow(QMainWindow):
         ai_results_layout.addLayout(close_row)
 
         # AI Command Bar (moved from bottom)
-        self.command_bar = QTextEdit(self)
+        self.command_bar = CommandBarTextEdit(self, main_window=self)
         self.command_bar.setPlaceholderText("AI Command (Ctrl+Enter to send)")
         self.command_bar.setFixedHeight(60)
         self.send_button = QPushButton("Send", self)
@@ -1137,7 +1697,12 @@ class MainWindow(QMainWindow):
 
         self.search_bar = QLineEdit()
         self.search_bar.setPlaceholderText("Search documents...")
-        self.search_bar.textChanged.connect(self.filter_library)
+        # Filter once typing pauses rather than on every keystroke
+        self._filter_timer = QTimer(self)
+        self._filter_timer.setSingleShot(True)
+        self._filter_timer.setInterval(250)
+        self._filter_timer.timeout.connect(lambda: self.filter_library(self.search_bar.text()))
+        self.search_bar.textChanged.connect(lambda _text: self._filter_timer.start())
         library_layout.addWidget(self.search_bar)
 
         self.folder_btn = QPushButton("New Folder")
@@ -1153,21 +1718,45 @@ class MainWindow(QMainWindow):
         self.library.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
         self.library.customContextMenuRequested.connect(self.show_library_context_menu)
         library_layout.addWidget(self.library)
-        
-        self.refresh_library()
+
+        # Placeholder until the deferred refresh_library() runs after the window is shown
+        self.library.addTopLevelItem(QTreeWidgetItem(["Loading..."]))
+
+        # Path -> tree item index, so single-item changes can update the tree in place
+        self._library_items: dict[str, QTreeWidgetItem] = {}
+        self._library_dirs: set[str] = set()
+        # Scanned (is_file, path) listings of folders whose child items are not created yet
+        self._unpopulated_dirs: dict[str, list[tuple[bool, str]]] = {}
+        self.library.itemExpanded.connect(self._on_library_item_expanded)
+
+        # Trigram index over file names so search filters the tree without touching the disk
+        self._name_index: dict[str, set[str]] = {} # trigram -> file paths
+        self._indexed_names: dict[str, str] = {} # file path -> casefolded name
+        self._library_filter = "" # Casefolded text of the active search
+        self._hidden_library_files: set[str] = set()
+
+        # Watch library folders for changes made outside Marknote; bursts are debounced
+        self._fs_watcher = QFileSystemWatcher(self)
+        self._fs_watcher.directoryChanged.connect(self._on_library_dir_changed)
+        self._pending_library_dirs: set[str] = set()
+        self._library_watch_timer = QTimer(self)
+        self._library_watch_timer.setSingleShot(True)
+        self._library_watch_timer.setInterval(200)
+        self._library_watch_timer.timeout.connect(self._sync_library_from_disk)
 
     def _init_editor_preview_stack(self):
         """Initializes the Markdown editor and preview, managed by a QStackedWidget."""
         self.editor = MarkdownEditor(parent=self, main_window=self)
-        self.preview = MarkdownPreview(parent=self, md_parser=self.md_parser)
+        self.preview = MarkdownPreview(md_parser=self.md_parser, parent=self)
         self.editor.contentChanged.connect(self._on_editor_content_changed)
+        # Scintilla tracks a save point: the title follows it on the first edit and on undo back to it
+        self.editor.modificationChanged.connect(self.set_dirty)
 
         self.stack = QStackedWidget()
         self.stack.addWidget(self.preview)  # index 0: Preview (default)
         self.stack.addWidget(self.editor)   # index 1: Editor
         self.current_mode = 'preview'  # or 'edit'
 
-        self.ai = AIMarkdownAssistant()  # Initialize AI assistant
         self.editor.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
         self.editor.customContextMenuRequested.connect(self.show_context_menu)
 
@@ -1180,7 +1769,7 @@ class MainWindow(QMainWindow):
         self.command_bar_layout.setSpacing(2) # Small spacing
         self.command_bar_widget.setLayout(self.command_bar_layout)
 
-        self.command_bar = QTextEdit(self) # Multi-line input for AI commands
+        self.command_bar = CommandBarTextEdit(self, main_window=self) # Multi-line input for AI commands
         self.command_bar.setPlaceholderText("AI Command (Ctrl+Enter to send)")
         self.command_bar.setFixedHeight(60) # Fixed height for the command bar input
         # self.command_bar.hide() # Initially hidden, shown by action/shortcut
@@ -1198,46 +1787,35 @@ class MainWindow(QMainWindow):
         self.command_shortcut.triggered.connect(self.show_command_bar)
         self.addAction(self.command_shortcut) # Add action to the main window
 
-        # Install event filter for Ctrl+Enter
-        self.command_bar.installEventFilter(self)
-
-    def _get_unique_filename(self, directory: Path, original_filename: str) -> Path:
+    def _claim_unique_asset_file(self, directory: Path, ext: str) -> tuple[int, Path]:
         """
-        Generates a unique filename in the given directory.
-        If 'original_filename' exists, appends a counter (e.g., image_1.png).
-        """
-        filepath = directory / original_filename
-        if not filepath.exists():
-            return filepath
+        Atomically creates a new file with a random name in the given directory.
 
-        name, ext = os.path.splitext(original_filename)
-        counter = 1
-        while True:
-            new_filename = f"{name}_{counter}{ext}"
-            new_filepath = directory / new_filename
-            if not new_filepath.exists():
-                return new_filepath
-            counter += 1
+        The 96-bit token makes a collision practically impossible, so there is no
+        retry loop; O_EXCL still turns one into a FileExistsError rather than an
+        overwrite.
+
+        _note_assets_dir caches the folder, so it may have been deleted outside
+        Marknote since; it is then created again and the open retried once.
+        Runs on pool threads too, so it only touches the filesystem.
 
-    def _get_unique_asset_filename(self, directory: Path, ext: str) -> Path:
-        """
-        Generates a unique filename in the given directory using a random hash.
         Args:
             directory (Path): The directory to save the file in.
             ext (str): The file extension (with dot), e.g., '.png'.
         Returns:
-            Path: The full path to a unique file.
+            tuple[int, Path]: An open, writable file descriptor and the path it refers to.
+        Raises:
+            OSError: If the file cannot be created.
         """
-        while True:
-            rand_hash = secrets.token_urlsafe(12)
-            filename = f"{rand_hash}{ext}"
-            filepath = directory / filename
-            if not filepath.exists():
-                return filepath
+        filepath = directory / f"{secrets.token_urlsafe(12)}{ext}"
+        try:
+            return os.open(filepath, _EXCL_CREATE_FLAGS, 0o644), filepath
+        except FileNotFoundError:
+            directory.mkdir(parents=True, exist_ok=True)
+            return os.open(filepath, _EXCL_CREATE_FLAGS, 0o644), filepath
 
     def _on_editor_content_changed(self):
-        is_dirty = self.editor.toPlainText() != self.last_saved_text
-        self.set_dirty(is_dirty)
+        # Dirty state comes from modificationChanged; nothing here copies or compares the text
         # Do NOT call self.update_preview() here; preview only updates on mode switch
         self.update_language_label()
 
@@ -1248,11 +1826,12 @@ class MainWindow(QMainWindow):
             base_title = "Marknote - Untitled"
         self.setWindowTitle(f"{base_title}{' *' if dirty else ''}")
 
-    def _update_file_state(self, content: str, filepath: str | None = None, dirty: bool = False):
-        self.last_saved_text = content
+    def _update_file_state(self, filepath: str | None = None, dirty: bool = False, refresh_preview: bool = True):
+        self.editor.setModified(dirty) # False sets Scintilla's save point to the current text
         self.current_file = filepath
         self._update_window_title(filepath, dirty)
-        self.update_preview()
+        if refresh_preview:
+            self.update_preview()
 
     def set_dirty(self, dirty: bool):
         self._update_window_title(self.current_file, dirty)
@@ -1270,28 +1849,41 @@ class MainWindow(QMainWindow):
 
         if not file_path: # If no path provided, show dialog
             # Start dialog in the default folder, filter for Markdown files
-            file_path, _ = QFileDialog.getOpenFileName(
-                self, "Open Markdown File", self.default_folder, 
-                "Markdown Files (*.md);;All Files (*)"
-            )
-        
+            dialog = QFileDialog(self, "Open Markdown File", self.default_folder,
+                                 "Markdown Files (*.md);;All Files (*)")
+            dialog.setFileMode(QFileDialog.FileMode.ExistingFile)
+            self._show_file_dialog(dialog, self._on_file_picked)
+            return
+
+        self._on_file_picked(file_path)
+
+    def _show_file_dialog(self, dialog: QFileDialog, on_selected):
+        """
+        Shows a file dialog window-modally with open() rather than exec(), so the
+        main event loop keeps running (exec() can stall the app behind the portal
+        on Linux). on_selected receives the chosen path; the dialog deletes itself
+        when closed.
+        """
+        dialog.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
+        dialog.fileSelected.connect(on_selected)
+        dialog.open()
+
+    def _on_file_picked(self, file_path: str):
+        """Opens the Markdown file chosen in the Open dialog (or passed to open_file)."""
         if file_path: # Proceed if a file path was selected or provided
-            try:
-                resolved_path = str(Path(file_path).resolve()) # Normalize the path
-                with open(resolved_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                self.editor.setPlainText(content)
-                self._update_file_state(content, resolved_path, False)
-                self.recent_files_manager.add_to_recent_files(resolved_path)
-                self.update_recent_files_menu()
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"Could not open file: {e}")
+            resolved_path = str(Path(file_path).resolve()) # Normalize the path
+            self._start_file_read(resolved_path, remember_as_last_note=False)
 
     def open_folder(self):
         """Opens a folder, setting it as the new default document library root."""
         # Start dialog from the current default folder
-        folder_path_str = QFileDialog.getExistingDirectory(self, "Open Folder", str(self.default_folder))
+        dialog = QFileDialog(self, "Open Folder", str(self.default_folder))
+        dialog.setFileMode(QFileDialog.FileMode.Directory)
+        dialog.setOption(QFileDialog.Option.ShowDirsOnly, True)
+        self._show_file_dialog(dialog, self._on_folder_picked)
+
+    def _on_folder_picked(self, folder_path_str: str):
+        """Makes the folder chosen in the Open Folder dialog the library root."""
         if folder_path_str:
             self.default_folder = str(Path(folder_path_str).resolve()) # Normalize and store
             
@@ -1325,15 +1917,15 @@ class MainWindow(QMainWindow):
             
             # When a folder is clicked, clear editor and show a message
             if not self.maybe_save_changes(): return # Check unsaved changes
+            self._cancel_pending_read()
             self.editor.setReadOnly(True)
             self.editor.setPlainText("Select a file to edit or create a new file in this folder.")
             self.preview.set_markdown("") # Clear preview
             self.current_file = None
-            self.last_saved_text = "" # Reset last saved text
+            self.editor.setModified(False) # The placeholder text is not an unsaved change
         elif path.is_file() and path.suffix.lower() == ".md":
             # If a .md file is clicked, open it
-            self.open_file(str(path)) # open_file handles maybe_save_changes
-            self.editor.setReadOnly(False) # Ensure editor is writable
+            self.open_file(str(path)) # open_file handles maybe_save_changes; the editor is made writable once loaded
 
     def load_markdown_file(self, path_str: str):
         """
@@ -1343,130 +1935,597 @@ class MainWindow(QMainWindow):
         Args:
             path_str (str): The absolute path to the Markdown file.
         """
-        try:
-            path = Path(path_str).resolve() # Ensure path is absolute and resolved
-            with open(path, "r", encoding="utf-8") as f:
-                content = f.read()
-            
-            self.editor.setPlainText(content)
-            self._update_file_state(content, str(path), False)
-            self.save_last_note(str(path)) # Update last opened note in config
-            self.update_preview() # <-- ensure preview is updated with correct base_url
-            self.set_dirty(False) # Reset dirty state
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to open file: {e}")
+        path = Path(path_str).resolve() # Ensure path is absolute and resolved
+        self._start_file_read(str(path), remember_as_last_note=True)
+
+    def _start_file_read(self, path_str: str, remember_as_last_note: bool):
+        """
+        Reads a note on the file I/O pool and loads it into the editor when done.
+        The editor is read-only in the meantime, so nothing typed is overwritten.
+
+        Args:
+            path_str (str): The resolved path of the note.
+            remember_as_last_note (bool): Store the note as the last opened one
+                (load_markdown_file) instead of adding it to the recent files (open_file).
+        """
+        if (path_str == self.current_file and self._pending_read_path is None
+                and not self.editor.isModified()):
+            # Already open and unchanged: skip the read and the editor reload
+            if remember_as_last_note:
+                self.save_last_note(path_str)
+            elif self.recent_files_manager.add_to_recent_files(path_str):
+                self.schedule_recent_files_menu_update()
+            return
+        if self._pending_read_path is None:
+            self._read_only_before_load = self.editor.isReadOnly()
+        self._pending_read_path = path_str
+        self.editor.setReadOnly(True)
+        self.statusBar().showMessage(f"Loading {os.path.basename(path_str)}...")
+        task = _FileReadTask(path_str)
+        task.signals.finished.connect(functools.partial(self._on_file_read, task.signals, remember_as_last_note))
+        task.signals.failed.connect(functools.partial(self._on_file_read_failed, task.signals))
+        self._file_task_signals.add(task.signals) # Keep alive until a result arrives
+        self._file_io_pool.start(task)
+
+    def _cancel_pending_read(self):
+        """Abandons a note load still running on the pool; its result is ignored when it arrives."""
+        if self._pending_read_path is None:
+            return
+        self._pending_read_path = None
+        self.statusBar().clearMessage()
+        self.editor.setReadOnly(self._read_only_before_load)
+
+    def _on_file_read(self, signals: QObject, remember_as_last_note: bool, path_str: str, content: str):
+        """Shows a note read by _start_file_read, unless another note was opened since."""
+        self._file_task_signals.discard(signals)
+        if path_str != self._pending_read_path:
+            return # Superseded by a later open
+        self._pending_read_path = None
+        self.statusBar().clearMessage()
+        self.editor.setReadOnly(False)
+        self.editor.setPlainText(content)
+        self._update_file_state(path_str, False)
+        if remember_as_last_note:
+            self.save_last_note(path_str) # Update last opened note in config
+        elif self.recent_files_manager.add_to_recent_files(path_str):
+            self.schedule_recent_files_menu_update()
+
+    def _on_file_read_failed(self, signals: QObject, path_str: str, message: str):
+        """Reports a note that could not be read and leaves the current one in the editor."""
+        self._file_task_signals.discard(signals)
+        if path_str != self._pending_read_path:
+            return
+        self._pending_read_path = None
+        self.statusBar().clearMessage()
+        self.editor.setReadOnly(self._read_only_before_load)
+        QMessageBox.critical(self, "Error", f"Could not open file: {message}")
     
-    def save_file(self):
-        """Saves the current content of the editor to the current_file path."""
+    def save_file(self, wait: bool = False):
+        """
+        Saves the current content of the editor to the current_file path.
+
+        The write runs on the file I/O pool. The save point is set right away, so
+        anything typed while it runs counts as unsaved; if the write fails, the
+        note is marked unsaved again.
+
+        Args:
+            wait (bool, optional): Write on this thread and report failure before
+                returning, for callers that act on the result. Defaults to False.
+        """
         text_content = self.editor.toPlainText()
         if self.current_file:
-            try:
-                with open(self.current_file, "w", encoding="utf-8") as f:
-                    f.write(text_content)
-                self._update_file_state(text_content, self.current_file, False)
-                self.recent_files_manager.add_to_recent_files(self.current_file)
-                self.update_recent_files_menu()
-                self.set_dirty(False) # Reset dirty state
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"Failed to save file: {e}")
+            if wait:
+                self._file_io_pool.waitForDone() # Earlier background saves land first
+                try:
+                    with open(self.current_file, "w", encoding="utf-8") as f:
+                        f.write(text_content)
+                except Exception as e:
+                    QMessageBox.critical(self, "Error", f"Failed to save file: {e}")
+                    return
+                self._last_autosave_text = text_content
+            else:
+                task = _FileWriteTask(self.current_file, text_content)
+                task.signals.finished.connect(functools.partial(self._on_file_written, task.signals))
+                task.signals.failed.connect(functools.partial(self._on_file_write_failed, task.signals))
+                self._file_task_signals.add(task.signals) # Keep alive until a result arrives
+                self._file_io_pool.start(task)
+            # A background write refreshes the preview when it lands (a new file doesn't exist yet)
+            self._update_file_state(self.current_file, False, refresh_preview=wait)
+            if self.recent_files_manager.add_to_recent_files(self.current_file):
+                self.schedule_recent_files_menu_update()
+            self.set_dirty(False) # Reset dirty state
         else:
             # If no current file, trigger "Save As" dialog
-            self.save_file_as()
-        self.update_preview()
-        self._last_autosave_text = self.editor.toPlainText()
+            self.save_file_as(wait=wait)
 
-    def save_file_as(self):
-        """Saves the current editor content to a new file, chosen via a dialog."""
+    def _on_file_written(self, signals: QObject, path_str: str, content: str):
+        self._file_task_signals.discard(signals)
+        if path_str == self.current_file:
+            self._last_autosave_text = content # Only text that reached the disk counts as saved
+            self.update_preview()
+
+    def _on_file_write_failed(self, signals: QObject, path_str: str, message: str):
+        """Reports a failed background save and marks the note unsaved again if it is still open."""
+        self._file_task_signals.discard(signals)
+        if path_str == self.current_file:
+            self.editor.setModified(True)
+        QMessageBox.critical(self, "Error", f"Failed to save file: {message}")
+
+    def save_file_as(self, wait: bool = False):
+        """
+        Saves the current editor content to a new file, chosen via a dialog.
+
+        Args:
+            wait (bool, optional): Run the dialog and the save before returning,
+                for callers that check the result (see maybe_save_changes).
+                Otherwise the dialog is shown without blocking. Defaults to False.
+        """
         # Start dialog in default folder, suggest current filename if available
         suggested_name = Path(self.current_file).name if self.current_file else "untitled.md"
         default_save_path = str(Path(self.default_folder) / suggested_name)
 
-        file_path_str, _ = QFileDialog.getSaveFileName(
-            self, "Save Markdown File As", default_save_path, 
-            "Markdown Files (*.md);;All Files (*)"
-        )
-        
+        if wait:
+            file_path_str, _ = QFileDialog.getSaveFileName(
+                self, "Save Markdown File As", default_save_path, 
+                "Markdown Files (*.md);;All Files (*)"
+            )
+            self._on_save_path_picked(file_path_str, wait=True)
+            return
+
+        dialog = QFileDialog(self, "Save Markdown File As", default_save_path,
+                             "Markdown Files (*.md);;All Files (*)")
+        dialog.setAcceptMode(QFileDialog.AcceptMode.AcceptSave)
+        self._show_file_dialog(dialog, self._on_save_path_picked)
+
+    def _on_save_path_picked(self, file_path_str: str, wait: bool = False):
+        """Saves the note under the path chosen in the Save As dialog."""
         if file_path_str:
             # Ensure .md extension
             if not file_path_str.lower().endswith('.md'):
                 file_path_str += '.md'
             
             self.current_file = str(Path(file_path_str).resolve()) # Update current file to new path
-            self.save_file() # Call save_file, which will now use the new current_file
-            self.update_preview()
-                             # This also handles adding to recent files and updating title.
+            self.save_file(wait=wait) # Call save_file, which will now use the new current_file (and refreshes the preview)
+                                      # This also handles adding to recent files and updating title.
 
     def refresh_library(self, filter_text: str = ""):
         """
-        Refreshes the document library tree view.
-
-        Populates the tree with files and folders from the default_folder,
-        optionally filtering by filter_text.
+        Refreshes the document library tree view.
+
+        Scans the default_folder once with os.scandir, indexing every file name
+        for search, but only builds tree items for the root folder; the items of
+        a subfolder are created when it is first expanded.
+
+        Args:
+            filter_text (str, optional): Text to filter items by. Defaults to "".
+        """
+        self.library.setUpdatesEnabled(False) # Lay out and paint once, after the tree is built
+        try:
+            self._rebuild_library(filter_text)
+        finally:
+            self.library.setUpdatesEnabled(True)
+
+    def _rebuild_library(self, filter_text: str):
+        """Scans the library folder and rebuilds the tree; see refresh_library."""
+        self.library.clear() # Clear existing items
+        self._library_items = {}
+        self._unpopulated_dirs = {}
+        self._name_index = {}
+        self._indexed_names = {}
+        self._hidden_library_files = set()
+        self._library_filter = filter_text.casefold()
+        base_path = Path(self.default_folder)
+        root_path = os.path.realpath(base_path)
+        dir_paths = self._scan_library_tree(root_path)
+
+        # Create a root item for the library (e.g., "Documents" or base_path.name)
+        # Using a simple name for the root node for cleaner display
+        display_root_name = base_path.name if base_path.name else str(base_path)
+        root_tree_item = self._make_library_item(root_path, is_dir=True)
+        root_tree_item.setText(0, display_root_name)
+        self._populate_library_item(root_tree_item)
+        self.library.addTopLevelItem(root_tree_item)
+        root_tree_item.setExpanded(True)
+        self._watch_library_dirs(dir_paths)
+        if self._library_filter:
+            self._reveal_library_matches()
+
+    @staticmethod
+    def _list_library_dir(dir_path: str) -> list[tuple[bool, str]]:
+        """
+        Lists a folder as (is_file, path) pairs: folders first, then files, all case-insensitive.
+
+        Only Markdown files are listed; hidden entries and _IGNORED_LIBRARY_DIRS are
+        skipped, so their contents are never walked or indexed.
+
+        Raises:
+            OSError: If the folder cannot be read.
+        """
+        entries = []
+        with os.scandir(dir_path) as it:
+            for e in it:
+                name = e.name
+                if name.startswith('.'):
+                    continue
+                is_dir = e.is_dir()
+                if is_dir:
+                    if name in _IGNORED_LIBRARY_DIRS:
+                        continue
+                elif not name.lower().endswith('.md'):
+                    continue
+                # The casefolded name is computed once per entry, not per comparison
+                entries.append((not is_dir, name.casefold(), e.path))
+        entries.sort(key=operator.itemgetter(0, 1))
+        return [(is_file, entry_path) for is_file, _, entry_path in entries]
+
+    def _scan_library_tree(self, root_path: str) -> list[str]:
+        """
+        Walks root_path iteratively, recording each folder's listing in _unpopulated_dirs
+        and indexing every file name (hidden if it doesn't match the active search).
+
+        Returns:
+            list[str]: The folders found, root_path included.
+        """
+        dir_paths = [root_path]
+        pending_dirs = [root_path]
+        while pending_dirs:
+            current_dir = pending_dirs.pop()
+            try:
+                listing = self._list_library_dir(current_dir)
+            except OSError as e:
+                # Log or display error if a directory can't be accessed
+                print(f"Error reading directory {current_dir}: {e}")
+                listing = []
+            self._unpopulated_dirs[current_dir] = listing
+            for is_file, entry_path in listing:
+                if is_file:
+                    self._index_library_file(entry_path)
+                    if self._library_filter not in self._indexed_names[entry_path]:
+                        self._hidden_library_files.add(entry_path)
+                else:
+                    dir_paths.append(entry_path)
+                    pending_dirs.append(entry_path)
+        return dir_paths
+
+    def _forget_scanned_dir(self, dir_path: str):
+        """Drops an unexpanded folder's listing, and those below it, from the index and watcher."""
+        stack = [dir_path]
+        while stack:
+            current_dir = stack.pop()
+            for is_file, entry_path in self._unpopulated_dirs.pop(current_dir, ()):
+                if is_file:
+                    self._unindex_library_file(entry_path)
+                else:
+                    stack.append(entry_path) # Folders below an unexpanded one have no items either
+            if current_dir in self._library_dirs:
+                self._library_dirs.discard(current_dir)
+                self._fs_watcher.removePath(current_dir)
+
+    def _resync_library_dir(self, dir_path: str) -> bool:
+        """
+        Brings one folder of the library in line with the disk, touching only the
+        entries that appeared or disappeared; unchanged items are kept as they are.
+
+        Returns:
+            bool: False if the folder could not be read (e.g. it was deleted).
+        """
+        try:
+            new_listing = self._list_library_dir(dir_path)
+        except OSError:
+            return False
+        new_dirs: list[str] = []
+        listing = self._unpopulated_dirs.get(dir_path)
+        if listing is not None:
+            # Not expanded yet: only the scanned listing and the index need updating
+            new_paths = {path_str for _, path_str in new_listing}
+            old_paths = {path_str for _, path_str in listing}
+            for is_file, path_str in listing:
+                if path_str not in new_paths:
+                    if is_file:
+                        self._unindex_library_file(path_str)
+                    else:
+                        self._forget_scanned_dir(path_str)
+            self._unpopulated_dirs[dir_path] = new_listing
+            for is_file, path_str in new_listing:
+                if path_str in old_paths:
+                    continue
+                if is_file:
+                    self._index_library_file(path_str)
+                    if self._library_filter not in self._indexed_names[path_str]:
+                        self._hidden_library_files.add(path_str)
+                else:
+                    new_dirs += self._scan_library_tree(path_str)
+            self._watch_library_dirs([*self._library_dirs, *new_dirs])
+            return True
+
+        item = self._library_items.get(dir_path)
+        if item is None:
+            return True # Folder already removed from the tree
+        children = {}
+        for i in range(item.childCount()):
+            child = item.child(i)
+            children[child.data(0, Qt.ItemDataRole.UserRole + 1)] = child
+        new_paths = {path_str for _, path_str in new_listing}
+        for path_str, child in children.items():
+            if path_str not in new_paths:
+                item.removeChild(child)
+                self._forget_library_item(child)
+        added = [(is_file, path_str) for is_file, path_str in new_listing if path_str not in children]
+        for is_file, path_str in added:
+            if not is_file:
+                new_dirs += self._scan_library_tree(path_str)
+        self._watch_library_dirs([*self._library_dirs, *new_dirs]) # Before inserting, so siblings sort as folders
+        for is_file, path_str in added:
+            self._insert_library_item(item, self._make_library_item(path_str, is_dir=not is_file), is_dir=not is_file)
+        return True
+
+    def _populate_library_item(self, item: QTreeWidgetItem):
+        """Creates the child items of a folder item from its scanned listing, if not done yet."""
+        listing = self._unpopulated_dirs.pop(item.data(0, Qt.ItemDataRole.UserRole + 1), None)
+        if listing is None:
+            return # Already populated, or not a folder
+        item.addChildren([self._make_library_item(path_str, is_dir=not is_file) for is_file, path_str in listing])
+        item.setChildIndicatorPolicy(QTreeWidgetItem.ChildIndicatorPolicy.DontShowIndicatorWhenChildless)
+
+    def _populate_library_subtree(self, item: QTreeWidgetItem):
+        """Populates item and every folder below it, for operations that walk the whole subtree."""
+        stack = [item]
+        while stack:
+            current = stack.pop()
+            self._populate_library_item(current)
+            stack.extend(current.child(i) for i in range(current.childCount()))
+
+    def _on_library_item_expanded(self, item: QTreeWidgetItem):
+        self._populate_library_item(item)
+
+    def _reveal_library_matches(self):
+        """Creates and expands the folders leading to files that match the active search."""
+        for path_str in self._indexed_names.keys() - self._hidden_library_files:
+            # Find the nearest ancestor that already has an item, then populate down from it
+            chain = []
+            dir_path = os.path.dirname(path_str)
+            while dir_path not in self._library_items:
+                chain.append(dir_path)
+                parent_path = os.path.dirname(dir_path)
+                if parent_path == dir_path:
+                    break # Reached the filesystem root without meeting the tree
+                dir_path = parent_path
+            item = self._library_items.get(dir_path)
+            for dir_path in reversed(chain):
+                if item is None:
+                    break
+                self._populate_library_item(item)
+                item = self._library_items.get(dir_path)
+            if item is None:
+                continue
+            self._populate_library_item(item)
+            while item is not None and not item.isExpanded():
+                item.setExpanded(True)
+                item = item.parent()
+
+    def _make_library_item(self, path_str: str, is_dir: bool) -> QTreeWidgetItem:
+        """
+        Creates a library tree item for a path and registers it in the path index.
+
+        Args:
+            path_str (str): The absolute path the item represents.
+            is_dir (bool): True for folders, False for files.
+
+        Returns:
+            QTreeWidgetItem: The new, not yet parented, item.
+        """
+        item = QTreeWidgetItem([os.path.basename(path_str)])
+        item.setData(0, Qt.ItemDataRole.UserRole + 1, path_str) # Store full path
+        # Set icon based on type, reusing the icons cached in __init__
+        item.setIcon(0, self._dir_icon if is_dir else self._file_icon)
+        self._library_items[path_str] = item
+        if is_dir:
+            if self._unpopulated_dirs.get(path_str):
+                # Children are created on first expand; show the arrow meanwhile
+                item.setChildIndicatorPolicy(QTreeWidgetItem.ChildIndicatorPolicy.ShowIndicator)
+        else:
+            if path_str not in self._indexed_names: # Files found by the scan are already indexed
+                self._index_library_file(path_str)
+            if self._library_filter not in self._indexed_names[path_str]:
+                item.setHidden(True) # Apply filter only to file names, not directories
+                self._hidden_library_files.add(path_str)
+        return item
+
+    def _index_library_file(self, path_str: str):
+        """Adds a file's name to the search index."""
+        folded_name = os.path.basename(path_str).casefold()
+        self._indexed_names[path_str] = folded_name
+        for gram in _trigrams(folded_name):
+            self._name_index.setdefault(gram, set()).add(path_str)
+
+    def _unindex_library_file(self, path_str: str):
+        """Removes a file's name from the search index."""
+        folded_name = self._indexed_names.pop(path_str, None)
+        if folded_name is None:
+            return
+        for gram in _trigrams(folded_name):
+            paths = self._name_index.get(gram)
+            if paths is not None:
+                paths.discard(path_str)
+                if not paths:
+                    del self._name_index[gram]
+        self._hidden_library_files.discard(path_str)
+
+    def _matching_library_files(self, folded_filter: str) -> set[str]:
+        """
+        Looks up the files whose casefolded name contains folded_filter.
 
-        Args:
-            filter_text (str, optional): Text to filter items by. Defaults to "".
+        Candidates come from intersecting the trigram sets of the query, then are
+        confirmed with a substring test, since sharing trigrams does not imply a match.
         """
-        self.library.clear() # Clear existing items
-        base_path = Path(self.default_folder)
-
-        # Recursive function to add items to the tree
-        def add_items_recursive(parent_widget_item: QTreeWidgetItem, current_dir: Path):
-            try:
-                # Sort entries: folders first, then files, all case-insensitive
-                entries = sorted(
-                    current_dir.iterdir(), 
-                    key=lambda x: (not x.is_dir(), x.name.lower())
-                )
-                for entry in entries:
-                    # Apply filter only to file names, not directories
-                    if entry.is_file() and filter_text.lower() not in entry.name.lower():
-                        continue
+        grams = _trigrams(folded_filter)
+        if not grams: # Queries under 3 characters have no trigrams to narrow by
+            candidates = self._indexed_names.keys()
+        else:
+            gram_sets = sorted((self._name_index.get(g, set()) for g in grams), key=len)
+            candidates = set.intersection(*gram_sets)
+        return {p for p in candidates if folded_filter in self._indexed_names[p]}
+
+    def _insert_library_item(self, parent_item: QTreeWidgetItem, item: QTreeWidgetItem, is_dir: bool):
+        """Inserts item under parent_item at its sorted position (folders first, then by name)."""
+        self._populate_library_item(parent_item) # Siblings from the scan come first, so item isn't duplicated
+        key = (not is_dir, item.text(0).casefold())
+        index = parent_item.childCount()
+        for i in range(parent_item.childCount()):
+            child = parent_item.child(i)
+            child_is_dir = child.data(0, Qt.ItemDataRole.UserRole + 1) in self._library_dirs
+            if (not child_is_dir, child.text(0).casefold()) > key:
+                index = i
+                break
+        parent_item.insertChild(index, item)
+
+    def _forget_library_item(self, item: QTreeWidgetItem):
+        """Drops item and its descendants from the path index and the folder watcher."""
+        self._populate_library_subtree(item) # Descendants known only from the scan get items to walk
+        stack = [item]
+        while stack:
+            current = stack.pop()
+            path_str = current.data(0, Qt.ItemDataRole.UserRole + 1)
+            self._library_items.pop(path_str, None)
+            self._unindex_library_file(path_str)
+            if path_str in self._library_dirs:
+                self._library_dirs.discard(path_str)
+                self._fs_watcher.removePath(path_str)
+            stack.extend(current.child(i) for i in range(current.childCount()))
+
+    def _relocate_library_item(self, item: QTreeWidgetItem, old_path_str: str, new_path_str: str):
+        """Rewrites the stored paths of item and its descendants after a rename."""
+        self._populate_library_subtree(item) # Descendants known only from the scan get items to rewrite
+        stack = [item]
+        while stack:
+            current = stack.pop()
+            path_str = current.data(0, Qt.ItemDataRole.UserRole + 1)
+            moved_path = new_path_str + path_str[len(old_path_str):]
+            current.setData(0, Qt.ItemDataRole.UserRole + 1, moved_path)
+            self._library_items.pop(path_str, None)
+            self._library_items[moved_path] = current
+            if path_str in self._library_dirs:
+                self._library_dirs.discard(path_str)
+                self._library_dirs.add(moved_path)
+                self._fs_watcher.removePath(path_str)
+                self._fs_watcher.addPath(moved_path)
+            elif path_str in self._indexed_names:
+                was_hidden = path_str in self._hidden_library_files
+                self._unindex_library_file(path_str)
+                self._index_library_file(moved_path)
+                if was_hidden:
+                    self._hidden_library_files.add(moved_path)
+            stack.extend(current.child(i) for i in range(current.childCount()))
+        item.setText(0, os.path.basename(new_path_str))
+        if new_path_str in self._indexed_names: # A renamed file may now match the filter, or stop matching
+            hidden = self._library_filter not in self._indexed_names[new_path_str]
+            item.setHidden(hidden)
+            if hidden:
+                self._hidden_library_files.add(new_path_str)
+            else:
+                self._hidden_library_files.discard(new_path_str)
+
+    def _watch_library_dirs(self, dir_paths: list[str]):
+        """Points the folder watcher at exactly dir_paths, touching only what changed."""
+        new_dirs = set(dir_paths)
+        stale = self._library_dirs - new_dirs
+        added = new_dirs - self._library_dirs
+        if stale:
+            self._fs_watcher.removePaths(list(stale))
+        if added:
+            self._fs_watcher.addPaths(list(added))
+        self._library_dirs = new_dirs
+
+    def _sync_library_path(self, path_str: str):
+        """
+        Applies a change Marknote made under path_str to the tree by diffing the
+        nearest folder the library already tracks, like a watcher event would.
+        Falls back to a full refresh only for paths outside the library.
+        """
+        dir_path = path_str
+        while dir_path not in self._library_dirs:
+            parent_path = os.path.dirname(dir_path)
+            if parent_path == dir_path:
+                self.refresh_library(self.search_bar.text())
+                return
+            dir_path = parent_path
+        self.library.setUpdatesEnabled(False)
+        try:
+            if not self._resync_library_dir(dir_path):
+                self.refresh_library(self.search_bar.text())
+            elif self._library_filter:
+                self._reveal_library_matches()
+        finally:
+            self.library.setUpdatesEnabled(True)
 
-                    item = QTreeWidgetItem([entry.name])
-                    item.setData(0, Qt.ItemDataRole.UserRole + 1, str(entry.resolve())) # Store full path
-                    
-                    # Set icon based on type (optional, requires QIcon setup)
-                    # if entry.is_dir():
-                    #     item.setIcon(0, QIcon.style().standardIcon(QStyle.SP_DirIcon))
-                    # else:
-                    #     item.setIcon(0, QIcon.style().standardIcon(QStyle.SP_FileIcon))
-
-                    parent_widget_item.addChild(item)
-                    if entry.is_dir():
-                        add_items_recursive(item, entry) # Recurse for subdirectories
-            except Exception as e:
-                # Log or display error if a directory can't be accessed
-                print(f"Error reading directory {current_dir}: {e}")
-        
-        # Create a root item for the library (e.g., "Documents" or base_path.name)
-        # Using a simple name for the root node for cleaner display
-        display_root_name = base_path.name if base_path.name else str(base_path)
-        root_tree_item = QTreeWidgetItem([display_root_name])
-        root_tree_item.setData(0, Qt.ItemDataRole.UserRole + 1, str(base_path.resolve()))
-        # root_tree_item.setIcon(0, QIcon.style().standardIcon(QStyle.SP_DriveHDIcon)) # Example icon
+    def _on_library_dir_changed(self, path_str: str):
+        """Queues a watched folder for re-checking; bursts of events share one check."""
+        self._pending_library_dirs.add(path_str)
+        self._library_watch_timer.start()
 
-        add_items_recursive(root_tree_item, base_path)
-        self.library.addTopLevelItem(root_tree_item)
-        self.library.expandAll() # Expand all items by default
+    def _sync_library_from_disk(self):
+        """
+        Re-checks folders reported by the watcher and applies what changed on disk
+        to the tree, item by item. Changes Marknote made itself have already been
+        applied, so they find nothing to do. Only a folder that can no longer be
+        read (e.g. deleted from outside) triggers a full refresh.
+        """
+        pending, self._pending_library_dirs = self._pending_library_dirs, set()
+        self.library.setUpdatesEnabled(False) # One repaint for the whole batch
+        try:
+            for dir_path in pending:
+                if dir_path not in self._library_dirs:
+                    continue # Folder already removed from the tree
+                if self._resync_library_dir(dir_path):
+                    continue
+                # The folder itself is gone: its parent's listing drops it, unless it was the root
+                parent_path = os.path.dirname(dir_path)
+                if parent_path not in self._library_dirs or not self._resync_library_dir(parent_path):
+                    self.refresh_library(self.search_bar.text())
+                    return
+            if self._library_filter:
+                self._reveal_library_matches()
+        finally:
+            self.library.setUpdatesEnabled(True)
 
     def filter_library(self, text: str):
         """
         Filters the document library based on the provided text.
-        Called when the search bar text changes.
+        Called 250 ms after the search bar text last changed.
 
         Args:
             text (str): The text to filter by.
         """
-        self.refresh_library(filter_text=text)
+        # Only toggle visibility of items whose match state changed; no directory walk
+        self._library_filter = text.casefold()
+        hidden = self._indexed_names.keys() - self._matching_library_files(self._library_filter)
+        # Files inside folders that were never expanded have no item yet; they get
+        # the right state from _make_library_item when created
+        for path_str in hidden - self._hidden_library_files:
+            item = self._library_items.get(path_str)
+            if item is not None:
+                item.setHidden(True)
+        for path_str in self._hidden_library_files - hidden:
+            item = self._library_items.get(path_str)
+            if item is not None:
+                item.setHidden(False)
+        self._hidden_library_files = hidden
+        if self._library_filter:
+            self.library.setUpdatesEnabled(False) # Expanding several folders costs one repaint
+            try:
+                self._reveal_library_matches()
+            finally:
+                self.library.setUpdatesEnabled(True)
 
     def create_folder(self):
         """Creates a new folder in the current default_folder after prompting for a name."""
         if not self.maybe_save_changes(): return
 
-        folder_name, ok = QInputDialog.getText(self, "Create Folder", "Folder name:")
+        folder_name, ok = self._prompt_text("Create Folder", "Folder name:")
         if ok and folder_name.strip():
             try:
                 new_folder_path = Path(self.default_folder) / folder_name.strip()
+                already_existed = new_folder_path.exists()
                 new_folder_path.mkdir(parents=True, exist_ok=True) # Create folder
                 
                 # Create a default "untitled.md" or "readme.md" in the new folder
@@ -1475,17 +2534,27 @@ class MainWindow(QMainWindow):
                 with open(default_md_path, 'w', encoding='utf-8') as f:
                     f.write(f"# {folder_name.strip()}\n\n") # Basic content
                 
-                self.refresh_library(self.search_bar.text()) # Refresh to show new folder
-                self.load_markdown_file(str(default_md_path)) # Open the new default file
-                self.editor.setReadOnly(False)
+                folder_path_str = os.path.realpath(new_folder_path)
+                root_item = self._library_items.get(os.path.dirname(folder_path_str))
+                if already_existed or root_item is None:
+                    self._sync_library_path(folder_path_str) # Diff the nearest tracked folder
+                else:
+                    # Add just the new folder (and its default file) to the tree
+                    folder_item = self._make_library_item(folder_path_str, is_dir=True)
+                    self._insert_library_item(root_item, folder_item, is_dir=True)
+                    folder_item.addChild(self._make_library_item(os.path.realpath(default_md_path), is_dir=False))
+                    self._watch_library_dirs([*self._library_dirs, folder_path_str])
+                    folder_item.setExpanded(True)
+                self.load_markdown_file(str(default_md_path)) # Open the new default file (writable once loaded)
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Failed to create folder or default file: {e}")
 
     def new_file(self):
         """Creates a new, empty file in the editor."""
         if self.maybe_save_changes():
+            self._cancel_pending_read() # Otherwise the load would fill the new buffer
             self.editor.clear()
-            self._update_file_state("", None, False)
+            self._update_file_state(None, False)
 
     def maybe_save_changes(self) -> bool:
         """
@@ -1498,17 +2567,16 @@ class MainWindow(QMainWindow):
         if self.editor.isReadOnly(): # No changes if read-only
             return True
         
-        current_text = self.editor.toPlainText()
-        if current_text != self.last_saved_text:
+        if self.editor.isModified():
             reply = QMessageBox.question(
                 self, "Unsaved Changes",
                 "You have unsaved changes. Do you want to save them?",
                 QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No | QMessageBox.StandardButton.Cancel
             )
             if reply == QMessageBox.StandardButton.Yes:
-                self.save_file()
+                self.save_file(wait=True)
                 # Check if save was successful (or if user cancelled save_file_as dialog)
-                if self.editor.toPlainText() != self.last_saved_text:
+                if self.editor.isModified():
                     return False # Save failed or was cancelled
             elif reply == QMessageBox.StandardButton.Cancel:
                 return False # User chose to cancel the operation
@@ -1562,7 +2630,7 @@ class MainWindow(QMainWindow):
         Renames a file or folder.
 
         Args:
-            item (QTreeWidgetItem): The tree item being renamed (currently unused but good for context).
+            item (QTreeWidgetItem): The tree item being renamed; it is updated in place.
             path_str (str): The current path of the file or folder.
             is_folder (bool): True if renaming a folder, False for a file.
         """
@@ -1570,20 +2638,27 @@ class MainWindow(QMainWindow):
         old_name = path.name
         
         prompt_text = f"Enter new name for {'folder' if is_folder else 'file'}:"
-        new_name, ok = QInputDialog.getText(self, "Rename", prompt_text, text=old_name)
+        new_name, ok = self._prompt_text("Rename", prompt_text, old_name)
         
         if ok and new_name.strip() and new_name.strip() != old_name:
-            new_path = path.parent / new_name.strip()
+            new_path_str = os.path.join(os.path.dirname(path_str), new_name.strip())
             # For files, ensure .md extension is preserved or added if necessary
-            if not is_folder and path.suffix.lower() == '.md' and not new_path.suffix.lower() == '.md':
-                new_path = new_path.with_suffix('.md')
+            if not is_folder and path_str.lower().endswith('.md') and not new_path_str.lower().endswith('.md'):
+                new_path_str = os.path.splitext(new_path_str)[0] + '.md'
+            new_path = Path(new_path_str)
 
             if new_path.exists():
                 QMessageBox.warning(self, "Rename Error", f"A file or folder named '{new_name.strip()}' already exists.")
                 return
             try:
                 path.rename(new_path) # Perform rename operation
-                self.refresh_library(self.search_bar.text()) # Refresh library view
+                if is_folder:
+                    self._assets_dir = None # The cached images folder may have moved with it
+                # Update the renamed item in place instead of rebuilding the whole tree
+                parent_item = item.parent() or self.library.invisibleRootItem()
+                parent_item.removeChild(item)
+                self._relocate_library_item(item, str(path), str(new_path))
+                self._insert_library_item(parent_item, item, is_folder)
                 # If the currently open file was renamed, update its path
                 if self.current_file == str(path):
                     self.current_file = str(new_path)
@@ -1600,7 +2675,7 @@ class MainWindow(QMainWindow):
         """
         if not self.maybe_save_changes(): return
 
-        file_name, ok = QInputDialog.getText(self, "New File", "Enter new file name (e.g., my_note.md):")
+        file_name, ok = self._prompt_text("New File", "Enter new file name (e.g., my_note.md):")
         if ok and file_name.strip():
             # Ensure .md extension
             if not file_name.strip().lower().endswith('.md'):
@@ -1612,41 +2687,44 @@ class MainWindow(QMainWindow):
                 return
             
             try:
-                with open(new_file_path, 'w', encoding='utf-8') as f:
-                    f.write(f"# {Path(file_name).stem}\n\n") # Initial content
+                # Unbuffered: the short heading goes out in a single write call
+                with open(new_file_path, 'wb', buffering=0) as f:
+                    f.write(f"# {os.path.splitext(file_name)[0]}\n\n".encode('utf-8')) # Initial content
                 
-                self.refresh_library(self.search_bar.text())
-                self.load_markdown_file(str(new_file_path)) # Open the new file
-                self.editor.setReadOnly(False)
+                # Add just the new file to its folder in the tree
+                parent_item = self._library_items.get(folder_path_str)
+                if parent_item is None:
+                    self._sync_library_path(folder_path_str)
+                else:
+                    new_item = self._make_library_item(os.path.realpath(new_file_path), is_dir=False)
+                    self._insert_library_item(parent_item, new_item, is_dir=False)
+                self.load_markdown_file(str(new_file_path)) # Open the new file (writable once loaded)
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Failed to create file: {e}")
 
     def ai_prompt_action(self, action_type: str):
         """Unified handler for all AI prompt-based actions."""
-        if not self.ai:
-            from config_utils import load_gemini_api_key
-            api_key = load_gemini_api_key()
-            if not api_key:
-                QMessageBox.warning(self, "API Key Missing", "Gemini API key not found. Please set it in Preferences.")
-                return
-            self.ai = AIMarkdownAssistant(api_key)
+        if not self._ensure_ai_assistant():
+            return
+        ai = self.ai
+        selected_text = self.editor.selectedText() # Read now; the request runs on a pool thread
 
         prompt_map = {
             'table': {
                 'label': "Describe the table you want to create:",
-                'ai_method': self.ai.create_table,
+                'ai_method': ai.create_table,
                 'success_msg': "AI table created successfully.",
                 'fail_msg': "AI Table Creation Failed"
             },
             'mermaid': {
                 'label': "Describe the diagram you want to create:",
-                'ai_method': self.ai.create_mermaid_diagram,
+                'ai_method': ai.create_mermaid_diagram,
                 'success_msg': "AI Mermaid diagram created successfully.",
                 'fail_msg': "AI Mermaid Diagram Creation Failed"
             },
             'command': {
                 'label': "Enter your AI command:",
-                'ai_method': lambda desc: self.ai.process_natural_command(desc, selected_text=self.editor.selectedText() or None),
+                'ai_method': lambda desc: ai.process_natural_command(desc, selected_text=selected_text or None),
                 'success_msg': "AI command executed.",
                 'fail_msg': "AI Command Failed"
             }
@@ -1666,25 +2744,30 @@ class MainWindow(QMainWindow):
             QMessageBox.information(self, "No Description", f"{action_type.capitalize()} description cannot be empty.")
             self.statusBar().showMessage(f"{action_type.capitalize()} creation cancelled: no description.", 3000)
             return
-        try:
-            self.statusBar().showMessage(f"AI is generating {action_type}...", 3000)
-            result = ai_method(prompt)
-            if result and not result.startswith("Error:") and not result.startswith("Failed to get valid response"):
-                # Insert or replace selection for command, always insert for table/mermaid
-                if action_type == 'command' and self.editor.selectedText():
-                    self.editor.replaceSelectedText(result)
-                else:
-                    self.editor.insert(result + "\n")
-                self.statusBar().showMessage(success_msg, 3000)
-                self.set_dirty(True)
+        self.statusBar().showMessage(f"AI is generating {action_type}...")
+        self._start_ai_task(
+            functools.partial(ai_method, prompt),
+            functools.partial(self._on_ai_prompt_result, action_type, success_msg, fail_msg),
+            functools.partial(self._on_ai_prompt_failed, action_type),
+            None, # No menu action starts this yet
+        )
+
+    def _on_ai_prompt_result(self, action_type: str, success_msg: str, fail_msg: str, result: str):
+        if result and not result.startswith("Error:") and not result.startswith("Failed to get valid response"):
+            # Insert or replace selection for command, always insert for table/mermaid
+            if action_type == 'command' and self.editor.selectedText():
+                self.editor.replaceSelectedText(result)
             else:
-                QMessageBox.critical(self, fail_msg, f"Could not generate result. AI response:\n{result}")
-                self.statusBar().showMessage(fail_msg, 3000)
-        except Exception as e:
-            import traceback
-            traceback.print_exc()
-            QMessageBox.critical(self, "AI Error", f"An unexpected error occurred: {e}")
-            self.statusBar().showMessage(f"Error during {action_type} creation.", 3000)
+                self.editor.insert(result + "\n")
+            self.statusBar().showMessage(success_msg, 3000)
+            self.set_dirty(True)
+        else:
+            QMessageBox.critical(self, fail_msg, f"Could not generate result. AI response:\n{result}")
+            self.statusBar().showMessage(fail_msg, 3000)
+
+    def _on_ai_prompt_failed(self, action_type: str, message: str):
+        QMessageBox.critical(self, "AI Error", f"An unexpected error occurred: {message}")
+        self.statusBar().showMessage(f"Error during {action_type} creation.", 3000)
 
     def ai_create_table(self):
         self.show_ai_panel()
@@ -1695,106 +2778,107 @@ class MainWindow(QMainWindow):
         self.ai_action_selector.setCurrentText("Create Mermaid Diagram")
         self.command_bar.setFocus()
     def execute_command(self):
+        if not self.send_button.isEnabled():
+            return # A request is still running (Ctrl+Enter bypasses the disabled button)
         if not self._ensure_ai_assistant():
             return
+        ai = self.ai
         action_type = self.ai_action_selector.currentText()
         prompt = self.command_bar.toPlainText().strip()
         selected_text = self.editor.selectedText()
-        full_text = self.editor.toPlainText()
-        self.ai_results_display.setText(f"<i>Processing '{action_type}'...</i>")
-        QApplication.processEvents()
-        response_text = ""
-        try:
-            if action_type == "General Command":
-                if not prompt:
-                    self.ai_results_display.setText("Please enter a command.")
-                    return
-                response_text = self.ai.process_natural_command(prompt, selected_text=selected_text or None)
-            elif action_type == "Summarize Page":
-                if not full_text.strip():
-                    self.ai_results_display.setText("Document is empty. Nothing to summarize.")
-                    return
-                response_text = self.ai.summarize_document(full_text)
-            elif action_type == "Create Table":
-                if not prompt:
-                    self.ai_results_display.setText("Please describe the table you want to create.")
-                    return
-                response_text = self.ai.create_table(prompt)
-            elif action_type == "Check Grammar & Style":
-                text_to_check = selected_text or full_text
-                if not text_to_check.strip():
-                    self.ai_results_display.setText("Nothing to check. Please select text or enter content.")
-                    return
-                response_text = self.ai.check_grammar_style(text_to_check)
-            elif action_type == "Auto-Link Page":
-                full_text = self.editor.toPlainText()
-                if not full_text.strip():
-                    self.ai_results_display.setText("Document is empty. Nothing to auto-link.")
-                    return
+        # Everything the request needs is read here; work() runs on a pool thread
+        default_folder = self.default_folder
+        current_file = str(self.current_file)
+        # work() returns markdown for the results panel unless show is replaced below
+        show = functools.partial(self._show_ai_command_response, action_type, prompt, selected_text)
+        # The full document is only materialized by the actions that use it
+        if action_type == "General Command":
+            if not prompt:
+                self.ai_results_display.setText("Please enter a command.")
+                return
+            work = functools.partial(ai.process_natural_command, prompt, selected_text=selected_text or None)
+        elif action_type == "Summarize Page":
+            full_text = self.editor.toPlainText()
+            if _is_blank(full_text):
+                self.ai_results_display.setText("Document is empty. Nothing to summarize.")
+                return
+            work = functools.partial(ai.summarize_document, full_text)
+        elif action_type == "Create Table":
+            if not prompt:
+                self.ai_results_display.setText("Please describe the table you want to create.")
+                return
+            work = functools.partial(ai.create_table, prompt)
+        elif action_type == "Check Grammar & Style":
+            text_to_check = selected_text or self.editor.toPlainText()
+            if _is_blank(text_to_check):
+                self.ai_results_display.setText("Nothing to check. Please select text or enter content.")
+                return
+            work = functools.partial(ai.check_grammar_style, text_to_check)
+        elif action_type == "Auto-Link Page":
+            full_text = self.editor.toPlainText()
+            if _is_blank(full_text):
+                self.ai_results_display.setText("Document is empty. Nothing to auto-link.")
+                return
+            def work():
                 # Gather all note titles (excluding current file)
-                from pathlib import Path
-                base_path = Path(self.default_folder)
-                note_titles = []
-                for md_file in base_path.rglob('*.md'):
-                    if str(md_file.resolve()) != str(self.current_file):
-                        note_titles.append(md_file.stem)
+                note_titles = [md_file.stem for md_file in Path(default_folder).rglob('*.md')
+                               if str(md_file.resolve()) != current_file]
                 if not note_titles:
-                    self.ai_results_display.setText("No other notes found to link to.")
-                    return
-                response_text = self.ai.auto_link_document(full_text, note_titles)
-            elif action_type == "Find Related Pages":
-                full_text = self.editor.toPlainText()
-                if not full_text.strip():
-                    self.ai_results_display.setText("No content in the current document.")
-                    return
-                from pathlib import Path
-                base_path = Path(self.default_folder)
+                    return None
+                return ai.auto_link_document(full_text, note_titles)
+            def show_links(response_text):
+                if response_text is None:
+                    self._show_ai_message("No other notes found to link to.")
+                else:
+                    self._show_ai_command_response(action_type, prompt, selected_text, response_text)
+            show = show_links
+        elif action_type == "Find Related Pages":
+            full_text = self.editor.toPlainText()
+            if _is_blank(full_text):
+                self.ai_results_display.setText("No content in the current document.")
+                return
+            def work():
                 all_notes = {}
-                for md_file in base_path.rglob('*.md'):
-                    if str(md_file.resolve()) != str(self.current_file):
+                for md_file in Path(default_folder).rglob('*.md'):
+                    if str(md_file.resolve()) != current_file:
                         try:
                             with open(md_file, 'r', encoding='utf-8') as f:
                                 all_notes[md_file.stem] = f.read()
                         except Exception:
                             continue
                 if not all_notes:
-                    self.ai_results_display.setText("No other notes found.")
-                    return
-                results = self.ai.find_related_pages(full_text, all_notes)
+                    return "No other notes found."
+                results = ai.find_related_pages(full_text, all_notes)
                 if not results or results[0][0] == "[Error]":
-                    self.ai_results_display.setText("Could not find related pages.")
-                    return
+                    return "Could not find related pages."
                 msg = "<b>Top Related Pages:</b><br><ul>"
                 for title, sim in results:
                     msg += f'<li><a href="wikilink://{title.replace(" ", "%20")}">{title}</a> (similarity: {sim:.2f})</li>'
                 msg += "</ul>"
-                self.ai_results_display.setText(msg)
-                self._clear_ai_action_buttons()
+                return msg
+            show = self._show_ai_message
+        elif action_type == "Semantic Search":
+            query = prompt
+            if not query:
+                self.ai_results_display.setText("Please enter a search query.")
                 return
-            elif action_type == "Semantic Search":
-                query = prompt
-                if not query:
-                    self.ai_results_display.setText("Please enter a search query.")
-                    return
-                from pathlib import Path
-                base_path = Path(self.default_folder)
+            def work():
                 all_notes = {}
-                for md_file in base_path.rglob('*.md'):
+                for md_file in Path(default_folder).rglob('*.md'):
                     try:
                         with open(md_file, 'r', encoding='utf-8') as f:
                             all_notes[md_file.stem] = f.read()
                     except Exception:
                         continue
                 if not all_notes:
-                    self.ai_results_display.setText("No notes found.")
-                    return
+                    return "No notes found."
                 try:
-                    query_emb = self.ai.get_embedding(query)
+                    query_emb = ai.get_embedding(query)
                     results = []
                     for title, text in all_notes.items():
                         try:
-                            emb = self.ai.get_embedding(text)
-                            sim = self.ai.cosine_similarity(query_emb, emb)
+                            emb = ai.get_embedding(text)
+                            sim = ai.cosine_similarity(query_emb, emb)
                             results.append((title, sim))
                         except Exception:
                             continue
@@ -1804,33 +2888,67 @@ class MainWindow(QMainWindow):
                     for title, sim in top_results:
                         msg += f'<li><a href="wikilink://{title.replace(" ", "%20")}">{title}</a> (similarity: {sim:.2f})</li>'
                     msg += "</ul>"
-                    self.ai_results_display.setText(msg)
-                    self._clear_ai_action_buttons()
-                    return
+                    return msg
                 except Exception as e:
-                    import traceback
-                    traceback.print_exc()
-                    self.ai_results_display.setText(f"<b>AI Error:</b> {e}")
-                    self._clear_ai_action_buttons()
-                    return
-            elif action_type == "Create Mermaid Diagram":
-                if not prompt:
-                    self.ai_results_display.setText("Please describe the diagram you want to create.")
-                    return
-                response_text = self.ai.create_mermaid_diagram(prompt)
+                    logger.exception("Semantic search failed")
+                    return f"<b>AI Error:</b> {e}"
+            show = self._show_ai_message
+        elif action_type == "Create Mermaid Diagram":
+            if not prompt:
+                self.ai_results_display.setText("Please describe the diagram you want to create.")
+                return
+            work = functools.partial(ai.create_mermaid_diagram, prompt)
+        else:
             # TODO: Add more actions here
+            show(None)
+            return
 
-            if not response_text:
-                self.ai_results_display.setMarkdown(f"<b>Error:</b><br><pre>No response from AI.</pre>")
-                self._clear_ai_action_buttons()
-            else:
-                self._handle_ai_response(response_text, action_type, original_prompt=prompt, context_text=selected_text)
-                self.command_bar.clear()
-        except Exception as e:
-            import traceback
-            traceback.print_exc()
-            self.ai_results_display.setMarkdown(f"<b>An unexpected error occurred:</b><br><pre>{e}</pre>")
+        self.ai_results_display.setText(f"<i>Processing '{action_type}'...</i>")
+        self._start_ai_task(work, show, self._show_ai_command_error, self.send_button)
+
+    def _start_ai_task(self, work, on_result, on_error, trigger):
+        """
+        Runs work() on the global thread pool so the editor stays responsive while
+        the AI answers. trigger (the button or action that started it) is disabled
+        until then.
+
+        Args:
+            work (Callable[[], object]): The blocking AI call; see _AITask.
+            on_result (Callable[[object], None]): Receives work()'s return value.
+            on_error (Callable[[str], None]): Receives the message if work() raised.
+            trigger (QWidget | QAction | None): Re-enabled when the task ends.
+        """
+        if trigger is not None:
+            trigger.setEnabled(False)
+        task = _AITask(work)
+        task.signals.finished.connect(functools.partial(self._on_ai_task_done, task.signals, trigger, on_result))
+        task.signals.failed.connect(functools.partial(self._on_ai_task_done, task.signals, trigger, on_error))
+        self._ai_task_signals.add(task.signals) # Keep alive until a result arrives
+        QThreadPool.globalInstance().start(task)
+
+    def _on_ai_task_done(self, signals: QObject, trigger, handler, result):
+        self._ai_task_signals.discard(signals)
+        if trigger is not None:
+            trigger.setEnabled(True)
+        handler(result)
+
+    def _show_ai_command_response(self, action_type: str, prompt: str, selected_text: str, response_text: str | None):
+        """Shows the answer to an AI panel command, or an error if there was none."""
+        if not response_text:
+            self.ai_results_display.setMarkdown(f"<b>Error:</b><br><pre>No response from AI.</pre>")
             self._clear_ai_action_buttons()
+        else:
+            self._handle_ai_response(response_text, action_type, original_prompt=prompt, context_text=selected_text)
+            self.command_bar.clear()
+
+    def _show_ai_message(self, msg: str):
+        """Shows a finished result or notice in the AI panel, without result buttons."""
+        self.ai_results_display.setText(msg)
+        self._clear_ai_action_buttons()
+
+    def _show_ai_command_error(self, message: str):
+        self.ai_results_display.setMarkdown(f"<b>An unexpected error occurred:</b><br><pre>{message}</pre>")
+        self._clear_ai_action_buttons()
 
     def ai_analyze_selected_table(self):
         """Analyzes the selected Markdown table using AI and displays insights."""
@@ -1840,36 +2958,37 @@ class MainWindow(QMainWindow):
             self.statusBar().showMessage("AI Table Analysis: No text selected.", 3000)
             return
 
-        if not self.ai:
-            api_key = load_gemini_api_key()
-            if not api_key:
-                QMessageBox.warning(self, "API Key Missing", 
-                                    "Gemini API key not found. Please set it in Preferences.")
-                return
-            self.ai = AIMarkdownAssistant(api_key)
+        if not self._ensure_ai_assistant():
+            return
 
-        try:
-            self.statusBar().showMessage("AI is analyzing table...", 3000)
-            analysis_result = self.ai.analyze_table(selected_text)
-
-            if analysis_result and not analysis_result.startswith("Error:") and not analysis_result.startswith("Failed to get valid response"):
-                # Display the analysis in a message box. 
-                # Analysis might be long, so consider a scrollable dialog for future improvement.
-                msg_box = QMessageBox(self)
-                msg_box.setWindowTitle("AI Table Analysis")
-                msg_box.setTextFormat(Qt.TextFormat.MarkdownText) # Render analysis as Markdown
-                msg_box.setText(analysis_result)
-                msg_box.setStandardButtons(QMessageBox.StandardButton.Ok)
-                msg_box.exec()
-                self.statusBar().showMessage("AI table analysis complete.", 3000)
-            else:
-                QMessageBox.critical(self, "AI Table Analysis Failed", 
-                                     f"Could not analyze table. AI response:\n{analysis_result}")
-                self.statusBar().showMessage("AI table analysis failed.", 3000)
-        except Exception as e:
-            logger.error(f"Error during AI table analysis: {e}")
-            QMessageBox.critical(self, "AI Error", f"An unexpected error occurred during table analysis: {e}")
-            self.statusBar().showMessage("Error during AI table analysis.", 3000)
+        self.statusBar().showMessage("AI is analyzing table...")
+        self._start_ai_task(
+            functools.partial(self.ai.analyze_table, selected_text),
+            self._on_table_analysis_result,
+            self._on_table_analysis_failed,
+            None, # No menu action starts this yet
+        )
+
+    def _on_table_analysis_result(self, analysis_result: str):
+        if analysis_result and not analysis_result.startswith("Error:") and not analysis_result.startswith("Failed to get valid response"):
+            # Display the analysis in a message box. 
+            # Analysis might be long, so consider a scrollable dialog for future improvement.
+            msg_box = QMessageBox(self)
+            msg_box.setWindowTitle("AI Table Analysis")
+            msg_box.setTextFormat(Qt.TextFormat.MarkdownText) # Render analysis as Markdown
+            msg_box.setText(analysis_result)
+            msg_box.setStandardButtons(QMessageBox.StandardButton.Ok)
+            msg_box.exec()
+            self.statusBar().showMessage("AI table analysis complete.", 3000)
+        else:
+            QMessageBox.critical(self, "AI Table Analysis Failed", 
+                                 f"Could not analyze table. AI response:\n{analysis_result}")
+            self.statusBar().showMessage("AI table analysis failed.", 3000)
+
+    def _on_table_analysis_failed(self, message: str):
+        logger.error(f"Error during AI table analysis: {message}")
+        QMessageBox.critical(self, "AI Error", f"An unexpected error occurred during table analysis: {message}")
+        self.statusBar().showMessage("Error during AI table analysis.", 3000)
 
     def delete_file_or_folder(self, item: QTreeWidgetItem, path_str: str, is_folder: bool):
         """
@@ -1884,9 +3003,12 @@ class MainWindow(QMainWindow):
         type_name = "folder" if is_folder else "file"
         
         if is_folder:
-            # Check if folder is empty (excluding system files like .DS_Store)
+            # Check if folder is empty (excluding system files like .DS_Store),
+            # stopping at the first entry that counts
             try:
-                if any(entry for entry in path.iterdir() if entry.name not in ['.DS_Store']): # macOS specific
+                with os.scandir(path) as it:
+                    not_empty = next((e for e in it if e.name not in _IGNORED_DIR_NAMES), None) is not None
+                if not_empty:
                     QMessageBox.warning(
                         self, "Cannot Delete Folder",
                         f"Folder '{path.name}' is not empty. Please delete its contents first."
@@ -1906,7 +3028,14 @@ class MainWindow(QMainWindow):
         if reply == QMessageBox.StandardButton.Yes:
             try:
                 if is_folder:
+                    # Clear out the ignored placeholder files first so rmdir succeeds
+                    for ignored_name in _IGNORED_DIR_NAMES:
+                        try:
+                            os.remove(os.path.join(path_str, ignored_name))
+                        except FileNotFoundError:
+                            pass
                     path.rmdir() # Remove empty directory
+                    self._assets_dir = None # It may have been (or contained) the cached images folder
                 else:
                     path.unlink() # Remove file
                 
@@ -1917,7 +3046,9 @@ class MainWindow(QMainWindow):
                        (is_folder and path in current_file_path.parents):
                         self.new_file() # Effectively clears the editor and resets state
 
-                self.refresh_library(self.search_bar.text())
+                # Remove just the deleted item from the tree
+                (item.parent() or self.library.invisibleRootItem()).removeChild(item)
+                self._forget_library_item(item)
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Failed to delete {type_name}: {e}")
 
@@ -1937,41 +3068,84 @@ class MainWindow(QMainWindow):
     def refine_selected_text(self):
         """Refines the selected text for clarity and conciseness using the AI assistant."""
         selected_text = self.editor.selectedText()
-        if selected_text:
-            refined_content = self.ai.refine_writing(selected_text)
-            self.editor.replaceSelectedText(refined_content)
+        if selected_text and self._ensure_ai_assistant():
+            self.statusBar().showMessage("AI is refining the selection...")
+            self._start_ai_task(
+                functools.partial(self.ai.refine_writing, selected_text),
+                self._on_refined_text,
+                functools.partial(self._on_ai_message_failed, "AI Refine"),
+                None, # No menu action starts this yet
+            )
+
+    def _on_refined_text(self, refined_content: str):
+        self.statusBar().clearMessage()
+        self.editor.replaceSelectedText(refined_content)
 
     def analyze_document(self):
         """Analyzes the entire document content using the AI assistant and shows results."""
         full_text = self.editor.toPlainText()
-        if not full_text.strip():
+        if _is_blank(full_text):
             QMessageBox.information(self, "AI Document Analysis", "The document is empty.")
             return
-        analysis_results = self.ai.analyze_document(full_text)
+        if not self._ensure_ai_assistant():
+            return
+        self.statusBar().showMessage("AI is analyzing the document...")
+        self._start_ai_task(
+            functools.partial(self.ai.analyze_document, full_text),
+            self._on_document_analysis,
+            functools.partial(self._on_ai_message_failed, "AI Document Analysis"),
+            None, # No menu action starts this yet
+        )
+
+    def _on_document_analysis(self, analysis_results: str):
+        self.statusBar().clearMessage()
         QMessageBox.information(self, "AI Document Analysis", analysis_results)
 
+    def _on_ai_message_failed(self, title: str, message: str):
+        self.statusBar().clearMessage()
+        QMessageBox.critical(self, title, f"An unexpected error occurred: {message}")
+
     def show_command_bar(self):
         self.show_ai_panel()
         self.ai_action_selector.setCurrentText("General Command")
         self.command_bar.setFocus()
 
 
-    def update_recent_files_menu(self):
-        """Updates the 'Open Recent' menu with the list from RecentFilesManager."""
-        self.recent_files_menu.clear()
-        if not self.recent_files_manager.recent_files_list:
-            no_recent_action = QAction("(No recent files)", self)
-            no_recent_action.setEnabled(False)
-            self.recent_files_menu.addAction(no_recent_action)
+    def schedule_recent_files_menu_update(self):
+        """Coalesces several menu rebuild requests within one event-loop tick into one rebuild."""
+        if self._recent_menu_update_pending:
             return
+        self._recent_menu_update_pending = True
+        QTimer.singleShot(0, self.update_recent_files_menu)
 
-        for file_path_str in self.recent_files_manager.recent_files_list:
-            path = Path(file_path_str)
-            # Display only the filename in the menu
-            action = QAction(path.name, self) 
-            action.setData(str(path)) # Store full path in action's data
-            action.triggered.connect(self.open_recent_file_action)
-            self.recent_files_menu.addAction(action)
+    def update_recent_files_menu(self):
+        """Updates the 'Open Recent' menu with the list from RecentFilesManager."""
+        self._recent_menu_update_pending = False
+        # Build a fixed pool of actions once per menu; later updates only retarget them
+        if getattr(self, '_recent_actions_menu', None) is not self.recent_files_menu:
+            self.recent_files_menu.clear()
+            self._no_recent_action = QAction("(No recent files)", self)
+            self._no_recent_action.setEnabled(False)
+            self.recent_files_menu.addAction(self._no_recent_action)
+            self._recent_actions = []
+            for _ in range(RecentFilesManager.MAX_RECENT_FILES):
+                action = QAction(self)
+                action.triggered.connect(self.open_recent_file_action)
+                self.recent_files_menu.addAction(action)
+                self._recent_actions.append(action)
+            self._recent_actions_menu = self.recent_files_menu
+
+        recent_files = self.recent_files_manager.recent_files_list
+        self._no_recent_action.setVisible(not recent_files)
+        for index, action in enumerate(self._recent_actions):
+            if index < len(recent_files):
+                file_path_str = recent_files[index]
+                # Display only the filename in the menu
+                action.setText(os.path.basename(file_path_str))
+                action.setData(file_path_str) # Store full path in action's data
+                action.setVisible(True)
+            else:
+                action.setVisible(False)
 
     def open_recent_file_action(self):
         """Action triggered when a recent file is selected from the menu."""
@@ -1983,7 +3157,8 @@ class MainWindow(QMainWindow):
 
     def export_file_as(self):
         """Exports the current document as HTML or Plain Text."""
-        if not self.editor.toPlainText().strip():
+        current_markdown_text = self.editor.toPlainText() # Read once; reused for the export below
+        if _is_blank(current_markdown_text):
             QMessageBox.information(self, "Export As", "There is no content to export.")
             return
 
@@ -2000,46 +3175,32 @@ class MainWindow(QMainWindow):
 
         path_to_save = Path(file_path_str)
         content_to_save = ""
-        current_markdown_text = self.editor.toPlainText()
 
         try:
             if "(*.html)" in selected_filter:
                 # Ensure .html extension
-                if path_to_save.suffix.lower() != ".html":
+                if not file_path_str.lower().endswith(".html"):
                     path_to_save = path_to_save.with_suffix(".html")
                 
                 # Convert Markdown to HTML (basic conversion, similar to preview)
-                html_content = markdown.markdown(current_markdown_text, extensions=['fenced_code'])
+                _EXPORT_MD.reset()
+                html_content = _EXPORT_MD.convert(current_markdown_text)
                 # Simple HTML wrapper with basic styling
-                content_to_save = f"""<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <title>Exported: {Path(self.current_file).name if self.current_file else "Untitled"}</title>
-    <style>
-        body {{ font-family: sans-serif; margin: 20px; line-height: 1.6; 
-                background-color: #fdfdfd; color: #333; }}
-        code {{ background-color: #f0f0f0; padding: 2px 4px; border-radius: 3px; 
-                font-family: monospace; }}
-        pre {{ background-color: #f0f0f0; padding: 10px; border-radius: 3px; 
-               overflow-x: auto; white-space: pre-wrap; }}
-        /* Add other styles as needed, e.g., for blockquotes, tables */
-    </style>
-</head>
-<body>
-{html_content}
-</body>
-</html>"""
+                content_to_save = _EXPORT_HTML_TEMPLATE.substitute(
+                    title=Path(self.current_file).name if self.current_file else "Untitled",
+                    body=html_content
+                )
             elif "(*.txt)" in selected_filter:
                 # Ensure .txt extension
-                if path_to_save.suffix.lower() != ".txt":
+                if not file_path_str.lower().endswith(".txt"):
                     path_to_save = path_to_save.with_suffix(".txt")
                 content_to_save = current_markdown_text
             else:
                 QMessageBox.warning(self, "Export Error", "Invalid file type selected.")
                 return
 
-            with open(path_to_save, 'w', encoding='utf-8') as f:
+            # A 1 MiB buffer lets large exports reach the disk in one or two writes
+            with open(path_to_save, 'w', encoding='utf-8', buffering=1 << 20) as f:
                 f.write(content_to_save)
             QMessageBox.information(self, "Export Successful", f"File exported successfully to {path_to_save}")
 
@@ -2052,28 +3213,8 @@ class MainWindow(QMainWindow):
 
     def show_syntax_help(self):
         """Displays a QMessageBox with Markdown and Mermaid syntax help."""
-        help_text = (
-            "<b>Markdown Syntax:</b><br>"
-            "<ul>"
-            "<li><b>Bold:</b> <code>**bold text**</code> or <code>__bold text__</code></li>"
-            "<li><b>Italic:</b> <code>*italic text*</code> or <code>_italic text_</code></li>"
-            "<li><b>Heading:</b> <code># H1</code>, <code>## H2</code>, <code>### H3</code></li>"
-            "<li><b>Unordered List:</b> <code>- Item 1</code><br><code>  - Subitem</code></li>"
-            "<li><b>Ordered List:</b> <code>1. Item 1</code><br><code>   1. Subitem</code></li>"
-            "<li><b>Link:</b> <code>[Link Text](https://example.com)</code></li>"
-            "<li><b>Image:</b> <code>![Alt Text](image_url_or_path.png)</code></li>"
-            "<li><b>Inline Code:</b> <code>`code here`</code></li>"
-            "<li><b>Code Block:</b><br><pre>```python\nprint('Hello')\n```</pre></li>"
-            "<li><b>Blockquote:</b> <code>> Quoted text</code></li>"
-            "<li><b>Horizontal Rule:</b> <code>---</code> or <code>***</code></li>"
-            "</ul>"
-            "<b>Mermaid Diagram Syntax:</b><br>"
-            "Enclose Mermaid syntax in a code block marked with `mermaid`:"
-            "<pre>```mermaid\ngraph TD\n  A[Start] --> B{Decision}\n  B -- Yes --> C[End]\n  B -- No --> D[Alternative]\n```</pre>"
-            "For more details, see the <a href='https://mermaid.js.org/intro/'>official Mermaid documentation</a>."
-        )
         # Use QMessageBox.about for rich text display
-        QMessageBox.about(self, "Markdown & Mermaid Syntax Guide", help_text)
+        QMessageBox.about(self, "Markdown & Mermaid Syntax Guide", _SYNTAX_HELP_HTML)
 
 
     def _open_settings_dialog(self):
@@ -2112,7 +3253,7 @@ class MainWindow(QMainWindow):
 
     def _normalize_path(self, path_str: str | None) -> str:
         """
-        Normalizes a path string using pathlib for robustness and platform-independence.
+        Normalizes a path string using os.path string operations.
         If the path is None or empty, returns a default path.
 
         Args:
@@ -2121,26 +3262,16 @@ class MainWindow(QMainWindow):
         Returns:
             str: The normalized, absolute path string.
         """
-        # Define a sensible default path, e.g., in user's Documents
-        default_path = Path.home() / 'Documents' / 'Marknote'
-        
         if not path_str: # Handles None or empty string
-            return str(default_path.resolve()) # Ensure default is also resolved
+            return _DEFAULT_PATH_STR
         
         try:
-            # Expand user directory (e.g., ~) and resolve to an absolute, canonical path
+            # Expand user directory (e.g., ~) and make the path absolute.
             # This also handles normalization of separators (e.g., / vs \) and . or .. components.
-            normalized_path = Path(path_str).expanduser().resolve()
-            return str(normalized_path)
-        except RuntimeError: 
-            # Path resolution can fail on some systems for certain invalid paths
-            # Example: Path("CON").resolve() on Windows.
-            # Fallback to default path in such rare cases.
-            return str(default_path.resolve())
-        except Exception: 
-            # Catch any other unexpected errors during path normalization.
-            # This is a safeguard; specific errors should be rare with Path.resolve().
-            return str(default_path.resolve())
+            return os.path.abspath(os.path.normpath(os.path.expanduser(path_str)))
+        except (TypeError, ValueError): 
+            # Safeguard for malformed input (e.g., embedded null characters).
+            return _DEFAULT_PATH_STR
 
 
     def get_or_create_default_folder(self) -> str:
@@ -2159,21 +3290,18 @@ class MainWindow(QMainWindow):
         if config_default_folder_str:
             normalized_path_from_config = Path(self._normalize_path(config_default_folder_str))
             try:
-                # Attempt to create the folder (and any necessary parents)
-                # exist_ok=True means it won't raise an error if the directory already exists.
+                # Attempt to create the folder (and any necessary parents).
+                # exist_ok=True only tolerates an existing *directory*; a file at the path
+                # raises FileExistsError and a file in a parent raises NotADirectoryError,
+                # so returning normally already proves it is a directory.
                 normalized_path_from_config.mkdir(parents=True, exist_ok=True)
                 
-                if normalized_path_from_config.is_dir(): # Check if it's actually a directory
-                    # If normalization changed the path string, update the config
-                    if str(normalized_path_from_config) != config_default_folder_str:
-                        config[CONFIG_KEY_DEFAULT_NOTES_FOLDER] = str(normalized_path_from_config)
-                        save_app_config(config)
-                    return str(normalized_path_from_config)
-                else:
-                    # This case occurs if the path exists but is not a directory,
-                    # or if mkdir somehow failed silently to make it a directory.
-                    raise OSError(f"Path '{normalized_path_from_config}' exists but is not a valid directory.")
-            except OSError as e:
+                # If normalization changed the path string, update the config
+                if str(normalized_path_from_config) != config_default_folder_str:
+                    config[CONFIG_KEY_DEFAULT_NOTES_FOLDER] = str(normalized_path_from_config)
+                    self._save_config_later(config)
+                return str(normalized_path_from_config)
+            except OSError as e: # Includes FileExistsError / NotADirectoryError
                 # Show a warning if the configured path is problematic
                 QMessageBox.warning(self, "Default Folder Error",
                                     f"The configured default folder '{normalized_path_from_config}' "
@@ -2204,7 +3332,7 @@ class MainWindow(QMainWindow):
 
         chosen_path_str: str
         if user_choice == QMessageBox.StandardButton.Yes:
-            chosen_path_str = str(Path.home() / 'Documents' / 'Marknote')
+            chosen_path_str = _DEFAULT_PATH_STR
         else:
             # Allow user to select an existing directory
             dialog_path = QFileDialog.getExistingDirectory(
@@ -2213,16 +3341,14 @@ class MainWindow(QMainWindow):
             if dialog_path:
                 chosen_path_str = dialog_path
             else: # User cancelled the dialog
-                chosen_path_str = str(Path.home() / 'Documents' / 'Marknote')
+                chosen_path_str = _DEFAULT_PATH_STR
                 QMessageBox.information(self, "Default Folder Set", 
                                         f"No folder selected. Using system default: {chosen_path_str}")
         
         final_chosen_path = Path(self._normalize_path(chosen_path_str))
 
         try:
-            final_chosen_path.mkdir(parents=True, exist_ok=True)
-            if not final_chosen_path.is_dir():
-                raise OSError(f"Chosen path '{final_chosen_path}' could not be established as a directory.")
+            final_chosen_path.mkdir(parents=True, exist_ok=True) # Raises unless the path ends up a directory
             
             config[CONFIG_KEY_DEFAULT_NOTES_FOLDER] = str(final_chosen_path)
             if not save_app_config(config):
@@ -2249,6 +3375,21 @@ class MainWindow(QMainWindow):
                                      f"Marknote will use your home directory: {str(Path.home())}")
                 return str(Path.home())
 
+    def _save_config_later(self, config: dict):
+        """
+        Records config changes in memory and writes them once no further change
+        has arrived for a second, so bursts (e.g. repeated pane toggles) cost a
+        single write. Anything still pending is flushed when the application quits.
+
+        Until then, load_app_config() returns the in-memory copy without touching
+        the disk.
+
+        Args:
+            config (dict): The full configuration dictionary, as from load_app_config().
+        """
+        update_app_config(config)
+        self._config_save_timer.start() # Restarting an active timer just resets its countdown
+
     def save_last_note(self, path_str: str):
         """
         Saves the path of the last opened note to the application configuration.
@@ -2260,123 +3401,185 @@ class MainWindow(QMainWindow):
         # Normalize the path before saving to ensure consistency
         normalized_path = self._normalize_path(path_str)
         
-        if normalized_path and Path(normalized_path).is_file(): # Ensure it's a valid file path
+        if normalized_path and os.path.isfile(normalized_path): # Ensure it's a valid file path
             config[CONFIG_KEY_LAST_NOTE] = normalized_path
-            save_app_config(config) 
+            self._save_config_later(config)
         else:
             # If path is invalid or becomes empty after normalization, remove from config
             if CONFIG_KEY_LAST_NOTE in config:
                 del config[CONFIG_KEY_LAST_NOTE]
-                save_app_config(config)
+                self._save_config_later(config)
             print(f"Warning: Attempted to save an invalid path for last note: {path_str}")
 
     def handle_pasted_image_url(self, url: str):
-        print(f"*** MARKNOTE PASTE DEBUG: handle_pasted_image_url CALLED with URL: {url}")
+        logger.debug("handle_pasted_image_url called with URL: %s", url)
         if not self.current_file:
             QMessageBox.warning(self, "Save Note First", 
                                 "Please save your note before pasting an image URL. "
                                 "The image will be saved relative to the note's location.")
-            alt_text, ok = QInputDialog.getText(self, "Link Text", f"Note not saved. Enter link text for {url}:", text=url.split('/')[-1])
+            alt_text, ok = self._prompt_text("Link Text", f"Note not saved. Enter link text for {url}:", url.split('/')[-1])
             if ok:
-                self.editor.insert(f"[{alt_text}]({url})")
+                self._replace_selection(f"[{alt_text}]({url})")
             else:
-                self.editor.insert(url)
+                self._replace_selection(url)
             self.set_dirty(True)
-            self.update_preview()
+            self.schedule_preview_update()
             return
 
         try:
-            current_note_path = Path(self.current_file)
-            assets_dir = current_note_path.parent / "_assets" / "images"
-            assets_dir.mkdir(parents=True, exist_ok=True)
+            assets_dir = self._note_assets_dir()
+        except OSError as e:
+            self._on_image_download_failed(url, "file", str(e))
+            return
 
-            print(f"*** MARKNOTE PASTE DEBUG: Downloading image from {url}")
-            response = requests.get(url, timeout=10, stream=True)
-            response.raise_for_status()
+        qurl = QUrl(url)
+        if qurl.isLocalFile():
+            # shutil.copyfile uses the OS zero-copy path (sendfile/fcopyfile/CopyFileW)
+            src_path = qurl.toLocalFile()
+            try:
+                fd, local_filepath = self._claim_unique_asset_file(assets_dir, os.path.splitext(src_path)[1].lower())
+                os.close(fd)
+                try:
+                    shutil.copyfile(src_path, local_filepath)
+                except OSError:
+                    local_filepath.unlink(missing_ok=True)
+                    raise
+            except OSError as e:
+                self._on_image_download_failed(url, "file", str(e))
+                return
+            self._on_image_download_finished(url, str(local_filepath))
+            return
 
-            # Determine extension from Content-Type or URL
-            parsed_qurl = QUrl(url)
-            url_path = parsed_qurl.path().lower()
-            url_ext = os.path.splitext(url_path)[1]
-            image_extensions = {'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.svg', '.webp'}
-            image_extensions_map = {
-                'image/jpeg': '.jpg', 'image/jpg': '.jpg',
-                'image/png': '.png',
-                'image/gif': '.gif',
-                'image/webp': '.webp',
-                'image/svg+xml': '.svg',
-                'image/bmp': '.bmp'
-            }
-            content_type = response.headers.get('Content-Type', '').lower().split(';')[0].strip()
-            if content_type in image_extensions_map:
-                ext = image_extensions_map[content_type]
-            elif url_ext in image_extensions:
-                ext = url_ext
+        if self._image_download_failed_recently(url):
+            self._on_image_download_failed(url, "cached", "A previous download of this image failed.")
+            return
+
+        # Download and save on a pool thread; the editor stays responsive meanwhile
+        logger.debug("Downloading image from %s", url)
+        self.statusBar().showMessage(f"Downloading image from {url}...")
+        task = _ImageDownloadTask(url, assets_dir, self._claim_unique_asset_file)
+        task.signals.finished.connect(self._on_image_download_finished)
+        task.signals.failed.connect(self._on_image_download_failed)
+        self._image_task_signals.add(task.signals) # Keep alive until a result arrives
+        QThreadPool.globalInstance().start(task)
+
+    def _release_image_download(self, signals: QObject | None = None):
+        """Drops the reference to the signals object of a finished download (default: the sender)."""
+        self._image_task_signals.discard(signals or self.sender())
+        if not self._image_task_signals: # Keep the "Downloading..." note while others are running
+            self.statusBar().clearMessage()
+
+    def _on_image_download_finished(self, url: str, local_path_str: str):
+        """
+        Prompts for alt text and inserts a downloaded image into the editor.
+
+        Args:
+            url (str): The original image URL.
+            local_path_str (str): Where the image was saved under the note's _assets/images.
+        """
+        self._release_image_download()
+        local_filepath = Path(local_path_str)
+        logger.debug("Image saved successfully to %s", local_filepath)
+
+        alt_text, ok = self._prompt_text("Image Alt Text", "Enter alt text for the image:", local_filepath.stem)
+        if ok:
+            markdown_image_tag = f"![{alt_text}]({_asset_rel_path(local_path_str)})"
+            self._replace_selection(markdown_image_tag)
+            self._optimize_image_later(local_path_str)
+        else:
+            logger.debug("Alt text cancelled, removing downloaded image and inserting URL as link")
+            local_filepath.unlink(missing_ok=True)
+            link_text_fallback, link_ok = self._prompt_text("Link Text", f"Alt text cancelled. Enter link text for {url}:", url.split('/')[-1])
+            if link_ok:
+                self._replace_selection(f"[{link_text_fallback}]({url})")
             else:
-                ext = '.png'  # fallback
+                self._replace_selection(url)
+        self.set_dirty(True)
+        self.schedule_preview_update()
 
-            local_filepath = self._get_unique_asset_filename(assets_dir, ext)
-            print(f"*** MARKNOTE PASTE DEBUG: Saving image to {local_filepath}")
+    def _on_image_download_failed(self, url: str, kind: str, message: str):
+        """
+        Reports a failed image download and pastes the URL as plain text instead.
 
-            with open(local_filepath, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
+        Args:
+            url (str): The image URL that could not be saved.
+            kind (str): "download", "file", "unexpected", or "cached" for a URL
+                skipped because it failed recently (it is not recorded again).
+            message (str): The error description.
+        """
+        if isinstance(self.sender(), _ImageTaskSignals):
+            self._release_image_download()
+        if kind in ("download", "cached"):
+            logger.warning("Error downloading image %s: %s", url, message)
+            if kind == "download":
+                self._remember_failed_image_download(url)
+            QMessageBox.warning(self, "Download Error", f"Failed to download image: {message}\n\nURL will be pasted as plain text.")
+        elif kind == "file":
+            logger.warning("Error saving image from %s: %s", url, message)
+            QMessageBox.warning(self, "File Error", f"Failed to save image: {message}\n\nURL will be pasted as plain text.")
+        else:
+            logger.error("Unexpected error while processing the image URL %s: %s", url, message)
+            QMessageBox.critical(self, "Unexpected Error", f"An unexpected error occurred while processing the image URL: {message}\n\nURL will be pasted as plain text.")
+        self._replace_selection(url)
+        self.set_dirty(True)
+        self.schedule_preview_update()
 
-            print(f"*** MARKNOTE PASTE DEBUG: Image saved successfully to {local_filepath}")
+    def _prompt_text(self, title: str, label: str, default: str = "") -> tuple[str, bool]:
+        """
+        Asks the user for a line of text.
 
-            alt_text, ok = QInputDialog.getText(self, "Image Alt Text", "Enter alt text for the image:", text=local_filepath.stem)
-            if ok:
-                relative_path = Path("_assets") / "images" / local_filepath.name
-                markdown_image_tag = f"![{alt_text}]({relative_path.as_posix()})"
-                self.editor.insert(markdown_image_tag)
-                self.set_dirty(True)
-                self.update_preview()
-            else:
-                print("*** MARKNOTE PASTE DEBUG: Alt text cancelled, removing downloaded image and inserting URL as link.")
-                local_filepath.unlink(missing_ok=True)
-                link_text_fallback, link_ok = QInputDialog.getText(self, "Link Text", f"Alt text cancelled. Enter link text for {url}:", text=url.split('/')[-1])
-                if link_ok:
-                    self.editor.insert(f"[{link_text_fallback}]({url})")
-                else:
-                    self.editor.insert(url)
-                self.set_dirty(True)
-                self.update_preview()
+        Each prompt gets its own dialog: the paste, download and probe callbacks can
+        ask while another prompt is still open, and a shared dialog would be
+        re-entered (exec() returns -1) with its text overwritten.
 
-        except requests.RequestException as e:
-            print(f"Error downloading image {url}: {e}")
-            QMessageBox.warning(self, "Download Error", f"Failed to download image: {e}\n\nURL will be pasted as plain text.")
-            self.editor.insert(url)
-            self.set_dirty(True)
-            self.update_preview()
-            return
-        except IOError as e:
-            print(f"Error saving image: {e}")
-            QMessageBox.warning(self, "File Error", f"Failed to save image: {e}\n\nURL will be pasted as plain text.")
-            self.editor.insert(url)
-            self.set_dirty(True)
-            self.update_preview()
-            return
-        except Exception as e:
-            print(f"An unexpected error occurred while processing the image URL {url}: {e}")
-            import traceback
-            print(traceback.format_exc())
-            QMessageBox.critical(self, "Unexpected Error", f"An unexpected error occurred while processing the image URL: {e}\n\nURL will be pasted as plain text.")
-            self.editor.insert(url)
-            self.set_dirty(True)
-            self.update_preview()
-            return
+        Args:
+            title (str): The dialog window title.
+            label (str): The prompt shown above the input field.
+            default (str, optional): Initial text of the input field. Defaults to "".
+
+        Returns:
+            tuple[str, bool]: The entered text and whether the user accepted, like QInputDialog.getText.
+        """
+        return QInputDialog.getText(self, title, label, text=default)
+
+    def probe_pasted_url(self, url: str):
+        """
+        Sends a HEAD request for a pasted URL without an image extension; the
+        reply's Content-Type decides whether it is pasted as an image or a link.
+
+        Args:
+            url (str): The pasted http(s) URL.
+        """
+        self.statusBar().showMessage(f"Checking {url}...")
+        reply = self._nam.head(QNetworkRequest(QUrl(url)))
+        reply.finished.connect(functools.partial(self._on_paste_probe_finished, reply, url))
+
+    def _on_paste_probe_finished(self, reply: QNetworkReply, url: str):
+        """Pastes url as an image if the HEAD reply reports image content, else as a link."""
+        reply.deleteLater()
+        self.statusBar().clearMessage()
+        is_image_url = False
+        if reply.error() == QNetworkReply.NetworkError.NoError:
+            content_type = reply.header(QNetworkRequest.KnownHeaders.ContentTypeHeader) or ''
+            logger.debug("HEAD request Content-Type: %s", content_type)
+            is_image_url = str(content_type).lower().startswith('image/')
+        else:
+            logger.warning("Could not verify URL content type for %s via HEAD request: %s", url, reply.errorString())
+        if is_image_url:
+            self.handle_pasted_image_url(url)
+        else:
+            self.handle_pasted_plain_url(url)
 
     def handle_pasted_plain_url(self, url: str):
         # For now, prompt for link text. AI part is a future enhancement.
         link_text_default = QUrl(url).host() or "Pasted Link" # Suggest domain or generic text
-        link_text, ok = QInputDialog.getText(self, "Insert Link", "Enter link text:", 
-                                            QLineEdit.EchoMode.Normal, link_text_default)
+        link_text, ok = self._prompt_text("Insert Link", "Enter link text:", link_text_default)
         if ok and link_text.strip():
-            self.editor.insert(f"[{link_text.strip()}]({url})")
+            self._replace_selection(f"[{link_text.strip()}]({url})")
             self.set_dirty(True)
         else:
             # If user cancels or enters no text, insert the URL as is, not as a link.
-            self.editor.insert(url)
+            self._replace_selection(url)
             self.set_dirty(True)
 
     def load_last_note(self):
@@ -2388,159 +3591,193 @@ class MainWindow(QMainWindow):
             # Normalize path from config before attempting to load
             normalized_path_str = self._normalize_path(last_note_path_str)
             if normalized_path_str: # Check if path is still valid after normalization
-                last_note_path = Path(normalized_path_str)
-                # Check if the file exists, is a file, and is a Markdown file
-                if last_note_path.exists() and last_note_path.is_file() and \
-                   last_note_path.suffix.lower() == '.md':
-                    self.load_markdown_file(str(last_note_path))
+                # Check if the file exists, is a file, and is a Markdown file (one stat call)
+                try:
+                    is_md_file = stat.S_ISREG(os.stat(normalized_path_str).st_mode) and \
+                                 normalized_path_str.lower().endswith('.md')
+                except OSError:
+                    is_md_file = False
+                if is_md_file:
+                    self.load_markdown_file(normalized_path_str)
                 else:
                     # Optional: If the last note path is invalid/missing, clear it from config
                     # This prevents repeated attempts to load a non-existent file.
                     if CONFIG_KEY_LAST_NOTE in config:
                         del config[CONFIG_KEY_LAST_NOTE]
-                        save_app_config(config)
+                        self._save_config_later(config)
                         print(f"Info: Last note '{normalized_path_str}' not found or invalid. Cleared from config.")
 
     def insert_link(self):
-        """Inserts a Markdown link template at the current cursor position in the editor."""
-        # Scintilla command to get current cursor position
-        # pos = self.editor.SendScintilla(self.editor.SCI_GETCURRENTPOS)
-        
-        template = "[Link Text](https://example.com)"
-        self.editor.insert(template) # Insert the template text
-        
-        # Optionally, move cursor to select "Link Text" or place it inside the URL parentheses
-        # current_pos = self.editor.SendScintilla(self.editor.SCI_GETCURRENTPOS)
-        # self.editor.SendScintilla(self.editor.SCI_SETSEL, current_pos - len(template) + 1, current_pos - len(template) + 1 + len("Link Text"))
+        """Inserts a Markdown link template at the cursor and selects its "Link Text" placeholder."""
+        start = self.editor.SendScintilla(QsciScintilla.SCI_GETSELECTIONSTART)
+        self.editor.SendScintilla(QsciScintilla.SCI_REPLACESEL, 0, _LINK_TEMPLATE_BYTES)
+        self.editor.SendScintilla(QsciScintilla.SCI_SETSEL, start + 1, start + 1 + len(_LINK_TEXT_PLACEHOLDER))
+
+    def _note_assets_dir(self) -> Path:
+        """
+        Returns the current note's _assets/images folder, creating it if needed.
+
+        The folder is cached until the note's directory changes, so repeated
+        inserts skip the mkdir call.
+
+        Raises:
+            OSError: If the folder cannot be created.
+        """
+        note_dir = Path(self.current_file).parent if self.current_file else Path.cwd()
+        assets_dir = note_dir / "_assets" / "images"
+        if assets_dir != self._assets_dir:
+            assets_dir.mkdir(parents=True, exist_ok=True)
+            self._assets_dir = assets_dir
+        return assets_dir
 
     def insert_image(self):
-        mode, ok = QInputDialog.getItem(self, "Insert Image", "Choose image source:", ["File", "URL"], 0, False)
-        if not ok:
+        dialog = _InsertImageDialog(self)
+        if not dialog.exec():
+            return
+        mode, source, width, height = dialog.values()
+        try:
+            assets_dir = self._note_assets_dir()
+        except OSError as e:
+            QMessageBox.warning(self, "Insert Image", f"Could not create the images folder:\n{e}")
             return
-        current_note_path = Path(self.current_file) if self.current_file else Path.cwd()
-        assets_dir = current_note_path.parent / "_assets" / "images"
-        assets_dir.mkdir(parents=True, exist_ok=True)
         if mode == "File":
-            file_path, _ = QFileDialog.getOpenFileName(self, "Select Image File", "", "Images (*.png *.jpg *.jpeg *.gif *.bmp *.webp)")
-            if not file_path:
-                return
-            width, ok_w = QInputDialog.getInt(self, "Image Width (optional)", "Width (px, 0 for original):", 0, 0)
-            if not ok_w:
-                return
-            height, ok_h = QInputDialog.getInt(self, "Image Height (optional)", "Height (px, 0 for original):", 0, 0)
-            if not ok_h:
+            file_path = source
+            if not os.path.isfile(file_path):
+                QMessageBox.warning(self, "Insert Image", f"Image file not found:\n{file_path}")
                 return
+            if width == 0 and height == 0:
+                # An image already in this note's images folder is linked as-is, without a copy
+                images_dir = os.path.abspath(assets_dir)
+                abs_file_path = os.path.abspath(file_path)
+                if os.path.dirname(abs_file_path) == images_dir:
+                    self._insert_image_markup(_asset_rel_path(abs_file_path), width, height)
+                    return
             ext = os.path.splitext(file_path)[1].lower()
-            if ext not in {'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.svg', '.webp'}:
+            if ext not in _IMAGE_EXTS:
                 ext = '.png'
-            local_filepath = self._get_unique_asset_filename(assets_dir, ext)
-            if width > 0 or height > 0:
-                img = Image.open(file_path)
-                orig_w, orig_h = img.size
-                new_w = width if width > 0 else orig_w
-                new_h = height if height > 0 else orig_h
-                img = img.resize((new_w, new_h), Image.LANCZOS)
-                img.save(local_filepath)
-            else:
-                shutil.copy2(file_path, local_filepath)
-            rel_path = Path("_assets") / "images" / local_filepath.name
-            if width > 0 or height > 0:
-                html = f'<img src="{rel_path.as_posix()}" width="{width if width > 0 else ''}" height="{height if height > 0 else ''}" />'
-                self.editor.insert(html)
-            else:
-                md = f'![image]({rel_path.as_posix()})'
-                self.editor.insert(md)
-        else:  # URL
-            url, ok = QInputDialog.getText(self, "Insert Image URL", "Image URL:")
-            if not ok or not url:
-                return
-            width, ok_w = QInputDialog.getInt(self, "Image Width (optional)", "Width (px, 0 for original):", 0, 0)
-            if not ok_w:
-                return
-            height, ok_h = QInputDialog.getInt(self, "Image Height (optional)", "Height (px, 0 for original):", 0, 0)
-            if not ok_h:
-                return
-            if url in MainWindow.failed_image_downloads:
-                QMessageBox.warning(self, "Image Download Failed", f"Previously failed to download image from URL:\n{url}\nInserting as remote link.")
-                if width > 0 or height > 0:
-                    html = f'<img src="{url}" width="{width if width > 0 else ''}" height="{height if height > 0 else ''}" />'
-                    self.editor.insert(html)
-                else:
-                    md = f'![image]({url})'
-                    self.editor.insert(md)
-                self.update_preview()
-                return
-            import urllib.parse
-            url_path = urllib.parse.urlparse(url).path.lower()
-            url_ext = os.path.splitext(url_path)[1]
-            image_extensions = {'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.svg', '.webp'}
+            # Claim the name now (O_EXCL); the worker overwrites the empty placeholder
             try:
-                resp = requests.get(url, timeout=10)
-                resp.raise_for_status()
-                content_type = resp.headers.get('Content-Type', '').lower().split(';')[0].strip()
-                image_extensions_map = {
-                    'image/jpeg': '.jpg', 'image/jpg': '.jpg',
-                    'image/png': '.png',
-                    'image/gif': '.gif',
-                    'image/webp': '.webp',
-                    'image/svg+xml': '.svg',
-                    'image/bmp': '.bmp'
-                }
-                if content_type in image_extensions_map:
-                    ext = image_extensions_map[content_type]
-                elif url_ext in image_extensions:
-                    ext = url_ext
-                else:
-                    ext = '.png'
-                local_filepath = self._get_unique_asset_filename(assets_dir, ext)
-                with open(local_filepath, "wb") as f:
-                    f.write(resp.content)
-                rel_path = Path("_assets") / "images" / local_filepath.name
-                success = True
-            except Exception:
-                try:
-                    headers = {
-                        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36",
-                        "Referer": url,
-                        "Accept": "image/avif,image/webp,image/apng,image/*,*/*;q=0.8",
-                    }
-                    resp = requests.get(url, headers=headers, timeout=10)
-                    resp.raise_for_status()
-                    content_type = resp.headers.get('Content-Type', '').lower().split(';')[0].strip()
-                    if content_type in image_extensions_map:
-                        ext = image_extensions_map[content_type]
-                    elif url_ext in image_extensions:
-                        ext = url_ext
-                    else:
-                        ext = '.png'
-                    local_filepath = self._get_unique_asset_filename(assets_dir, ext)
-                    with open(local_filepath, "wb") as f:
-                        f.write(resp.content)
-                    rel_path = Path("_assets") / "images" / local_filepath.name
-                    success = True
-                except Exception as e:
-                    MainWindow.failed_image_downloads.add(url)
-                    QMessageBox.warning(self, "Image Download Failed", f"Failed to download image from URL:\n{url}\nError: {e}\nInserting as remote link.")
-                    if width > 0 or height > 0:
-                        html = f'<img src="{url}" width="{width if width > 0 else ''}" height="{height if height > 0 else ''}" />'
-                        self.editor.insert(html)
-                    else:
-                        md = f'![image]({url})'
-                        self.editor.insert(md)
-                    self.update_preview()
-                    self.set_dirty(True)
-                    return
-            if width > 0 or height > 0:
-                html = f'<img src="{rel_path.as_posix()}" width="{width if width > 0 else ''}" height="{height if height > 0 else ''}" />'
-                self.editor.insert(html)
-            else:
-                md = f'![image]({rel_path.as_posix()})'
-                self.editor.insert(md)
-        self.update_preview()
+                fd, local_filepath = self._claim_unique_asset_file(assets_dir, ext)
+            except OSError as e:
+                QMessageBox.warning(self, "Insert Image", f"Could not save the image:\n{e}")
+                return
+            os.close(fd)
+            # Resize/copy on a pool thread; the markup is inserted once the file is written
+            task = _ImageImportTask(file_path, local_filepath, width, height)
+            task.signals.finished.connect(functools.partial(self._on_inserted_image_downloaded, task.signals, width, height))
+            task.signals.failed.connect(functools.partial(self._on_image_import_failed, task.signals))
+            self._image_task_signals.add(task.signals) # Keep alive until a result arrives
+            QThreadPool.globalInstance().start(task)
+        else:  # URL(s)
+            # Several whitespace-separated URLs download in parallel on the thread pool;
+            # each image is inserted as soon as its own download finishes
+            for url in source.split():
+                self._start_inserted_image_download(url, assets_dir, width, height)
+
+    def _start_inserted_image_download(self, url: str, assets_dir: Path, width: int, height: int):
+        """
+        Downloads an image for insert_image on the thread pool, or links it remotely
+        right away if an earlier download of the same URL failed.
+
+        Args:
+            url (str): The image URL.
+            assets_dir (Path): The note's images folder.
+            width (int): Width in px, 0 for original.
+            height (int): Height in px, 0 for original.
+        """
+        if self._image_download_failed_recently(url):
+            QMessageBox.warning(self, "Image Download Failed", f"Previously failed to download image from URL:\n{url}\nInserting as remote link.")
+            self._insert_image_markup(url, width, height)
+            return
+        # Download on a pool thread; the markup is inserted once the file is saved
+        self.statusBar().showMessage(f"Downloading image from {url}...")
+        task = _ImageDownloadTask(url, assets_dir, self._claim_unique_asset_file)
+        task.signals.finished.connect(functools.partial(self._on_inserted_image_downloaded, task.signals, width, height))
+        task.signals.failed.connect(functools.partial(self._on_inserted_image_failed, task.signals, width, height))
+        self._image_task_signals.add(task.signals) # Keep alive until a result arrives
+        QThreadPool.globalInstance().start(task)
+
+    def _insert_image_markup(self, src: str, width: int, height: int):
+        """
+        Inserts an image reference, as an <img> tag when a size was requested.
+
+        Args:
+            src (str): Relative path or URL of the image.
+            width (int): Width in px, 0 for original.
+            height (int): Height in px, 0 for original.
+        """
+        if width > 0 or height > 0:
+            # Only the dimensions that were asked for get an attribute
+            w_attr = f' width="{width}"' if width > 0 else ''
+            h_attr = f' height="{height}"' if height > 0 else ''
+            markup = f'<img src="{src}"{w_attr}{h_attr} />'
+        else:
+            markup = f'![image]({src})'
+        self._replace_selection(markup)
+        self.schedule_preview_update()
         self.set_dirty(True)
 
+    def _replace_selection(self, text: str):
+        """
+        Replaces the selection (or inserts at the caret) with text and leaves the
+        caret after it, encoding to UTF-8 once for a single Scintilla call.
+        """
+        self.editor.SendScintilla(QsciScintilla.SCI_REPLACESEL, 0, text.encode('utf-8'))
+
+    def _on_inserted_image_downloaded(self, signals: QObject, width: int, height: int, source: str, local_path_str: str):
+        """Inserts an image saved by insert_image (downloaded or copied), referenced relative to the note."""
+        self._release_image_download(signals)
+        self._insert_image_markup(_asset_rel_path(local_path_str), width, height)
+        self._optimize_image_later(local_path_str)
+
+    def _optimize_image_later(self, path_str: str):
+        """Queues a saved image for lossless recompression on the post-processing pool."""
+        if _JPEGOPTIM or _OPTIPNG:
+            self._postprocess_pool.start(_ImageOptimizeTask(path_str))
+
+    def _on_image_import_failed(self, signals: QObject, src_path: str, kind: str, message: str):
+        """Reports a local image that could not be copied into the assets folder."""
+        self._release_image_download(signals)
+        QMessageBox.warning(self, "Insert Image Failed", f"Could not copy image:\n{src_path}\nError: {message}")
+
+    def _image_download_failed_recently(self, url: str) -> bool:
+        """
+        True if url failed within FAILED_IMAGE_DOWNLOAD_TTL. An expired entry is
+        dropped in memory only; the config catches up on the next recorded failure.
+        """
+        failed_at = MainWindow.failed_image_downloads.get(url)
+        if failed_at is None:
+            return False
+        if time.time() - failed_at < FAILED_IMAGE_DOWNLOAD_TTL:
+            return True
+        del MainWindow.failed_image_downloads[url]
+        return False
+
+    def _remember_failed_image_download(self, url: str):
+        """Adds url to the persisted negative cache, evicting the oldest entries past the cap."""
+        failed = MainWindow.failed_image_downloads
+        failed[url] = time.time()
+        failed.move_to_end(url)
+        while len(failed) > MAX_FAILED_IMAGE_DOWNLOADS:
+            failed.popitem(last=False)
+        config = load_app_config()
+        config[FAILED_IMAGE_DOWNLOADS_KEY] = dict(failed)
+        self._save_config_later(config)
+
+    def _on_inserted_image_failed(self, signals: QObject, width: int, height: int, url: str, kind: str, message: str):
+        """Remembers a failed insert_image download and links the remote image instead."""
+        self._release_image_download(signals)
+        self._remember_failed_image_download(url)
+        QMessageBox.warning(self, "Image Download Failed", f"Failed to download image from URL:\n{url}\nError: {message}\nInserting as remote link.")
+        self._insert_image_markup(url, width, height)
+
+    def schedule_preview_update(self):
+        """Requests a preview refresh; calls within 120 ms of each other share one render."""
+        self._preview_timer.start() # Restarting an active timer just resets its countdown
+
     def update_preview(self):
         """Updates the Markdown preview pane with the current editor content."""
+        self._preview_timer.stop() # Any pending scheduled refresh is covered by this one
         if not self.current_file or not Path(self.current_file).is_file():
             self.preview.set_markdown("", base_url=QUrl())
             return
@@ -2579,10 +3816,15 @@ class MainWindow(QMainWindow):
             self.language_label.setText(f"Language: {self.language_override} (manual)")
             return
         text = self.editor.toPlainText()
-        try:
-            lang = detect(text) if text.strip() else "unknown"
-        except LangDetectException:
+        if _is_blank(text):
             lang = "unknown"
+        else:
+            # Imported on first use: langdetect loads its language profiles at import
+            from langdetect import detect, LangDetectException
+            try:
+                lang = detect(text)
+            except LangDetectException:
+                lang = "unknown"
         self.language_label.setText(f"Language: {lang}")
 
     def set_language_override(self, value):
@@ -2602,7 +3844,7 @@ class MainWindow(QMainWindow):
         # Save last mode
         config = load_app_config()
         config[LAST_VIEW_MODE_KEY] = self.current_mode
-        save_app_config(config)
+        self._save_config_later(config)
 
     def toggle_sidebar(self):
         visible = not self.library_panel.isVisible()
@@ -2611,7 +3853,7 @@ class MainWindow(QMainWindow):
         # Save sidebar visibility in config
         config = load_app_config()
         config['sidebar_visible'] = visible
-        save_app_config(config)
+        self._save_config_later(config)
 
     def handle_wiki_link(self, page_name):
         from pathlib import Path
@@ -2658,10 +3900,11 @@ class MainWindow(QMainWindow):
         self.ai_results_display.setText("Semantic search: enter your query and click 'Send'.")
         self._clear_ai_action_buttons()
 
-    def _handle_ai_result_link(self, link):
-        # Handles clicks on AI result links (wikilink://...)
-        if link.startswith("wikilink://"):
-            page = link[len("wikilink://"):].replace("%20", " ")
+    def _handle_ai_result_link(self, link: QUrl):
+        # Handles clicks on AI result links (wikilink://...); anchorClicked passes a QUrl
+        link_str = link.toString()
+        if link_str.startswith("wikilink://"):
+            page = QUrl.fromPercentEncoding(link_str[len("wikilink://"):].encode('utf-8'))
             self.handle_wiki_link(page)
 
     def _on_ai_action_selected(self, action_text: str):
@@ -2688,11 +3931,13 @@ class MainWindow(QMainWindow):
         if self.ai:
             return True
         try:
+            from ai import AIMarkdownAssistant # Deferred: pulls in requests and numpy
             self.ai = AIMarkdownAssistant() # AIMarkdownAssistant handles key loading
             return True
         except ValueError as e:
             self.ai_results_display.setMarkdown(f"<b>AI Error:</b> Gemini API key not found. Please set it in Preferences via File > Preferences.<br><pre>{e}</pre>")
             self._clear_ai_action_buttons()
+            self.show_ai_panel() # Callers outside the panel would otherwise show nothing
             return False
 
     def _handle_ai_response(self, response_text: str, action_type: str, original_prompt: str = None, context_text: str = None):
@@ -2700,17 +3945,6 @@ class MainWindow(QMainWindow):
         self._clear_ai_action_buttons()
         self._add_ai_action_button("Copy Result", lambda: QApplication.clipboard().setText(response_text))
 
-    def eventFilter(self, obj, event):
-        if obj is self.command_bar and event.type() == QEvent.Type.KeyPress:
-            from PyQt6.QtGui import QKeyEvent
-            key_event = event
-            if isinstance(key_event, QKeyEvent):
-                if key_event.key() in (Qt.Key.Key_Return, Qt.Key.Key_Enter) and \
-                   key_event.modifiers() == Qt.KeyboardModifier.ControlModifier:
-                    self.execute_command()
-                    return True
-        return super().eventFilter(obj, event)
-
     def ai_check_grammar_style(self):
         self.show_ai_panel()
         self.ai_action_selector.setCurrentText("Check Grammar & Style")
@@ -2748,19 +3982,25 @@ class MainWindow(QMainWindow):
             if not text:
                 QMessageBox.warning(self, "Empty Document", "Document is empty.")
                 return
-        # Call AI
-        self.statusBar().showMessage("Summarizing with AI...")
-        try:
-            summary = self.ai.advanced_summarize(
-                text_to_summarize=text,
-                length_preference=opts["length"],
-                style=opts["style"],
-                keywords=opts["keywords"] if opts["keywords"] else None
-            )
-        except Exception as e:
-            self.statusBar().showMessage("")
-            QMessageBox.critical(self, "AI Error", f"Failed to summarize: {e}")
+        if not self._ensure_ai_assistant():
             return
+        # Call AI on a pool thread; the result lands in _show_advanced_summary
+        self.statusBar().showMessage("Summarizing with AI...")
+        work = functools.partial(
+            self.ai.advanced_summarize,
+            text_to_summarize=text,
+            length_preference=opts["length"],
+            style=opts["style"],
+            keywords=opts["keywords"] if opts["keywords"] else None
+        )
+        self._start_ai_task(work, self._show_advanced_summary, self._on_advanced_summary_failed,
+                            self.adv_summarization_action)
+
+    def _on_advanced_summary_failed(self, message: str):
+        self.statusBar().showMessage("")
+        QMessageBox.critical(self, "AI Error", f"Failed to summarize: {message}")
+
+    def _show_advanced_summary(self, summary: str):
         self.statusBar().showMessage("")
         # Show result in AI results panel
         self.ai_results_display.setMarkdown(f"<b>Advanced Summary:</b>\n\n{summary}")
@@ -1,6 +1,6 @@
 #!/bin/bash
 sudo apt-get update
-sudo apt-get install libxcb-cursor0 libgl1 libegl1
+sudo apt-get install libxcb-cursor0 libgl1 libegl1 build-essential libjpeg-dev zlib1g-dev # last three: pillow-simd build
 set -e
 
 # Step 1: Detect platform and required venv activate script